@@ -1,42 +1,110 @@
 from fastapi import APIRouter, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from passlib.context import CryptContext
 import os
+import csv
+import io
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from utils import get_db_connection, get_user
-from cryptography.fernet import Fernet
+from utils import clamp_page_size, LOG_PAGE_SIZE
+from db_pool import pool_stats
+from decrypt_cache import decrypt_cache
+from batch_decrypt import decrypt_batch, batch_stats
+from hashing import hash_password, verify_password, HashingBusy, BUSY_ERROR, hashing_stats
+from throttle import login_throttle, client_ip
+from log_stats import week_start_for
+from jobs import job_queue
+from llm_cache import summary_cache
+from write_buffer import log_write_buffer
+from encryption import fernet
+from rekey import rotation_status
+from search_index import search_logs, search_context
+from repository import repository
+from user_cache import user_cache
+from page_cache import cached_page, page_cache
 
 
 load_dotenv()
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY").encode()
-fernet = Fernet(ENCRYPTION_KEY)
 
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "25"))
+
+# Sortable columns exposed to the dashboard; values are trusted SQL expressions.
+DASHBOARD_SORTS = {
+    "username": "u.username",
+    "name": "u.last_name",
+    "email": "u.email",
+    "log_count": "log_count",
+    "last_log": "s.last_log_date",
+}
+
+def _like_prefix(text):
+    # "!" rather than backslash as the escape, which both MySQL and SQLite read the same way
+    return text.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+
+def dashboard_query(q="", sort="username", direction="asc", page=1, page_size=ADMIN_PAGE_SIZE):
+    # Counts come from the maintained user_log_stats rows (see log_stats.py),
+    # so this reads one row per user instead of scanning daily_logs.
+    # Prefix matches keep the search on the users indexes (see schema.py).
+    where, args = "", []
+    if q:
+        where = """
+            WHERE u.username LIKE %s ESCAPE '!' OR u.email LIKE %s ESCAPE '!'
+               OR u.first_name LIKE %s ESCAPE '!' OR u.last_name LIKE %s ESCAPE '!'
+        """
+        args = [_like_prefix(q)] * 4
+
+    order = DASHBOARD_SORTS.get(sort, "u.username")
+    direction = "DESC" if direction == "desc" else "ASC"
+    tiebreak = "" if order == "u.username" else f", u.username {direction}"
+
+    page_sql = f"""
+        SELECT u.username, u.first_name, u.last_name, u.email, u.phone_number, u.is_active,
+               COALESCE(s.log_count, 0) AS log_count,
+               s.last_log_date,
+               CASE WHEN s.week_start = %s THEN s.week_count ELSE 0 END AS logs_this_week
+        FROM users u
+        LEFT JOIN user_log_stats s ON s.username = u.username
+        {where}
+        ORDER BY {order} {direction}{tiebreak}
+        LIMIT %s OFFSET %s
+    """
+    page_args = [week_start_for(date.today())] + args + [page_size, (page - 1) * page_size]
+    count_sql = f"SELECT COUNT(*) AS total FROM users u {where}"
+    return (page_sql, tuple(page_args)), (count_sql, tuple(args))
+
+def dashboard_context(request, users, total, q, sort, direction, page, page_size):
+    return {
+        "request": request,
+        "users": users,
+        "total": total,
+        "q": q,
+        "sort": sort,
+        "direction": direction,
+        "page": page,
+        "page_size": page_size,
+        "pages": max(1, -(-total // page_size))
+    }
 
 @router.get("/admin", response_class=HTMLResponse)
-def admin_dashboard(request: Request):
+def admin_dashboard(request: Request, q: str = "", sort: str = "username", direction: str = "asc", page: int = 1):
     if not request.session.get("is_admin"):
         return RedirectResponse("/admin-login", status_code=302)
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT username, first_name, last_name, email, phone_number, is_active,
-        (SELECT COUNT(*) FROM daily_logs WHERE daily_logs.username = users.username) AS log_count
-        FROM users
-    """)
-    users = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    return templates.TemplateResponse("admin_dashboard.html", {
-        "request": request,
-        "users": users
-    })
+    q = q.strip()
+    page = max(1, page)
+    page_query, count_query = dashboard_query(q, sort, direction, page, ADMIN_PAGE_SIZE)
+
+    users = repository.query(*page_query, dictionary=True)
+    total = repository.query_one(*count_query, dictionary=True)["total"]
+
+    return templates.TemplateResponse(
+        "admin_dashboard.html",
+        dashboard_context(request, users, total, q, sort, direction, page, ADMIN_PAGE_SIZE)
+    )
 
 @router.get("/admin-signup", response_class=HTMLResponse)
 def admin_signup_form(request: Request):
@@ -51,23 +119,22 @@ def admin_signup(request: Request,
                  username: str = Form(...),
                  password: str = Form(...)):
 
-    existing_user = get_user(username)
+    existing_user = user_cache.get(username)
     if existing_user:
         return templates.TemplateResponse("admin_signup.html", {
             "request": request,
             "error": "Username already exists."
         })
 
-    hashed_pw = pwd_context.hash(password)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO users (first_name, last_name, email, phone_number, username, password, is_admin)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-    """, (first_name, last_name, email, phone_number, username, hashed_pw, True))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        hashed_pw = hash_password(password)
+    except HashingBusy:
+        return templates.TemplateResponse("admin_signup.html", {
+            "request": request,
+            "error": BUSY_ERROR
+        }, status_code=503)
+    repository.create_user(username, hashed_pw, first_name, last_name, email, phone_number, is_admin=True)
+    user_cache.invalidate(username)
 
     request.session["username"] = username
     request.session["is_admin"] = True
@@ -80,9 +147,24 @@ def admin_login_form(request: Request):
 
 @router.post("/admin-login")
 def admin_login(request: Request, username: str = Form(...), password: str = Form(...)):
-    user = get_user(username)
+    retry_after = login_throttle.hit(username, client_ip(request))
+    if retry_after:
+        return templates.TemplateResponse("admin_login.html", {
+            "request": request,
+            "error": f"Too many login attempts. Please try again in {retry_after} seconds."
+        }, status_code=429, headers={"Retry-After": str(retry_after)})
+
+    user = repository.get_user(username)
     if user and user["is_admin"]:
-        if pwd_context.verify(password, user["password"]):  # ✅ verify hashed password
+        try:
+            password_ok = verify_password(password, user["password"])
+        except HashingBusy:
+            return templates.TemplateResponse("admin_login.html", {
+                "request": request,
+                "error": BUSY_ERROR
+            }, status_code=503)
+        if password_ok:  # ✅ verify hashed password
+            login_throttle.reset(username)
             request.session["username"] = username
             request.session["is_admin"] = True
             return RedirectResponse("/admin", status_code=302)
@@ -107,34 +189,49 @@ def admin_home(request: Request):
     return templates.TemplateResponse("admin_home.html", {"request": request})
 
 @router.get("/admin/user-logs/{username}", response_class=HTMLResponse)
-def view_user_logs(username: str, request: Request):
+def view_user_logs(username: str, request: Request, cursor: str = None, page_size: int = LOG_PAGE_SIZE):
     if not request.session.get("is_admin"):
         return RedirectResponse("/admin-login", status_code=302)
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT log_date, entry FROM daily_logs WHERE username = %s ORDER BY log_date DESC", (username,))
-    logs_raw = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    page_size = clamp_page_size(page_size)
 
-    logs = []
-    for log in logs_raw:
-        try:
-            decrypted = fernet.decrypt(log['entry'].encode()).decode()
-        except Exception:
-            decrypted = "[Error decrypting log]"
-        logs.append({
-            "log_date": log["log_date"],
-            "entry": decrypted
-        })  
-
-    return templates.TemplateResponse("admin_user_logs.html", {
-        "request": request,
-        "logs": logs,
-        "username": username,
-        "error":"user not found"
-    })
+    def render():
+        logs_raw, next_cursor = repository.log_page(username, cursor, page_size)
+
+        decrypted = decrypt_batch(
+            fernet, [row[2] for row in logs_raw],
+            row_ids=[row[0] for row in logs_raw], table="daily_logs", owner=username,
+            placeholder="[Error decrypting log]"
+        )
+        logs = [
+            {"log_date": row[1], "entry": entry}
+            for row, entry in zip(logs_raw, decrypted)
+        ]
+
+        return templates.TemplateResponse("admin_user_logs.html", {
+            "request": request,
+            "logs": logs,
+            "username": username,
+            "next_cursor": next_cursor,
+            "page_size": page_size,
+            "is_first_page": cursor is None,
+            "error":"user not found"
+        })
+
+    stamp = repository.content_version(username)
+    if stamp is None:
+        return render()
+    return cached_page(request, stamp, ("admin-user-logs", username, cursor, page_size), render)
+
+@router.get("/admin/user-logs/{username}/search", response_class=HTMLResponse)
+def search_user_logs(username: str, request: Request, q: str = "", before: int = None):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    rows, next_before = search_logs(username, q, before) if q.strip() else ([], None)
+    return templates.TemplateResponse("admin_user_search.html", search_context(
+        request, username, q, rows, next_before, f"/admin/user-logs/{username}/search"
+    ))
 
 @router.post("/admin/deactivate/{username}")
 def deactivate_user(username: str, request: Request):
@@ -142,15 +239,9 @@ def deactivate_user(username: str, request: Request):
         return RedirectResponse("/admin-login", status_code=302)
 
     admin = request.session.get("username")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET is_active = FALSE WHERE username = %s", (username,))
-    cursor.execute("INSERT INTO admin_logs (admin_username, action, target_user) VALUES (%s, %s, %s)",
-                   (admin, "deactivated user", username))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    repository.set_active(username, False, admin)
+    # Their open sessions are cut off on the next request (main.check_account_active)
+    user_cache.invalidate(username)
 
     return RedirectResponse("/admin", status_code=302)
 
@@ -160,37 +251,147 @@ def reactivate_user(username: str, request: Request):
         return RedirectResponse("/admin-login", status_code=302)
 
     admin = request.session["username"]
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("UPDATE users SET is_active = TRUE WHERE username = %s", (username,))
-    cursor.execute("INSERT INTO admin_logs (admin_username, action, target_user) VALUES (%s, %s, %s)",
-                   (admin, "reactivated user", username))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    repository.set_active(username, True, admin)
+    user_cache.invalidate(username)
 
     return RedirectResponse("/admin", status_code=302)
 
+AUDIT_PAGE_SIZE = int(os.getenv("AUDIT_PAGE_SIZE", "50"))
+AUDIT_ACTIONS = ["deactivated user", "reactivated user"]
+EXPORT_BATCH_SIZE = 1000
+
+def _parse_audit_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        timestamp, log_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        return None
+
+def _audit_filters(admin_username, target_user, action):
+    # Equality filters only, each backed by an (x, timestamp, id) index in schema.py.
+    clauses, args = [], []
+    for column, value in (("admin_username", admin_username), ("target_user", target_user), ("action", action)):
+        if value:
+            clauses.append(f"{column} = %s")
+            args.append(value)
+    return clauses, args
+
 @router.get("/admin/audit-logs", response_class=HTMLResponse)
-def audit_logs(request: Request):
+def audit_logs(request: Request, cursor: str = None, admin_username: str = "", target_user: str = "", action: str = ""):
     if not request.session.get("is_admin"):
         return RedirectResponse("/admin-login", status_code=302)
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT admin_username, action, target_user, timestamp 
+    clauses, args = _audit_filters(admin_username.strip(), target_user.strip(), action)
+    position = _parse_audit_cursor(cursor)
+    if position:
+        clauses.append("(timestamp < %s OR (timestamp = %s AND id < %s))")
+        args += [position[0], position[0], position[1]]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    logs = repository.query(f"""
+        SELECT id, admin_username, action, target_user, timestamp 
         FROM admin_logs 
-        ORDER BY timestamp DESC
-    """)
-    logs = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        {where}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT %s
+    """, (*args, AUDIT_PAGE_SIZE + 1), dictionary=True)
+
+    next_cursor = None
+    if len(logs) > AUDIT_PAGE_SIZE:
+        logs = logs[:AUDIT_PAGE_SIZE]
+        next_cursor = f"{logs[-1]['timestamp'].isoformat()}_{logs[-1]['id']}"
 
     return templates.TemplateResponse("admin_audit_logs.html", {
         "request": request,
-        "logs": logs
-    })
\ No newline at end of file
+        "logs": logs,
+        "next_cursor": next_cursor,
+        "admin_username": admin_username,
+        "target_user": target_user,
+        "action": action,
+        "actions": AUDIT_ACTIONS
+    })
+
+@router.get("/admin/audit-logs/export")
+def export_audit_logs(request: Request, start: date, end: date, admin_username: str = "", target_user: str = "", action: str = ""):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    clauses, args = _audit_filters(admin_username.strip(), target_user.strip(), action)
+    clauses += ["timestamp >= %s", "timestamp < %s"]
+    args += [start, end + timedelta(days=1)]
+
+    def rows():
+        # Streamed in batches, so memory stays flat however large the range is.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["timestamp", "admin_username", "action", "target_user"])
+        for batch in repository.stream(f"""
+            SELECT timestamp, admin_username, action, target_user
+            FROM admin_logs
+            WHERE {' AND '.join(clauses)}
+            ORDER BY timestamp, id
+        """, tuple(args), EXPORT_BATCH_SIZE):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    filename = f"audit-logs-{start.isoformat()}-to-{end.isoformat()}.csv"
+    return StreamingResponse(rows(), media_type="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    })
+
+@router.get("/admin/stats")
+def admin_stats(request: Request):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    return JSONResponse({
+        "db_pool": pool_stats(),
+        "decrypt_cache": decrypt_cache.stats(),
+        "decrypt_batches": batch_stats(),
+        "hashing": hashing_stats(),
+        "login_throttle": login_throttle.stats(),
+        "jobs": job_queue.stats(),
+        "llm_cache": summary_cache.stats(),
+        "log_writes": log_write_buffer.stats(),
+        "user_cache": user_cache.stats(),
+        "page_cache": page_cache.stats()
+    })
+
+@router.get("/admin/key-rotation")
+def key_rotation_status(request: Request):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    job = job_queue.active_for("system", "key_rotation")
+    return JSONResponse({
+        "status": rotation_status(),
+        "job": {"id": job["id"], "status": job["status"], "attempts": job["attempts"]} if job else None
+    })
+
+@router.post("/admin/key-rotation")
+def start_key_rotation(request: Request):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    # Runs on the job queue; progress is saved per batch, so a retried or
+    # restarted job resumes instead of starting over.
+    if not job_queue.active_for("system", "key_rotation"):
+        job_queue.enqueue("key_rotation", {"requested_by": request.session.get("username")}, owner="system")
+
+    return RedirectResponse("/admin/key-rotation", status_code=303)
+
+@router.post("/admin/search-index/backfill")
+def start_search_backfill(request: Request, rebuild: bool = Form(False)):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    if not job_queue.active_for("system", "search_backfill"):
+        job_queue.enqueue("search_backfill", {"rebuild": rebuild}, owner="system")
+
+    return RedirectResponse("/admin/stats", status_code=303)
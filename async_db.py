@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+
+import aiomysql
+
+from metrics import record_query
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool():
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await aiomysql.create_pool(
+                    host=os.getenv("DB_HOST"),
+                    port=int(os.getenv("DB_PORT", "3306")),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    db=os.getenv("DB_NAME"),
+                    minsize=int(os.getenv("ASYNC_DB_POOL_MIN", "1")),
+                    maxsize=int(os.getenv("ASYNC_DB_POOL_SIZE", "20")),
+                    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+                    autocommit=False,
+                )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+async def fetchall(sql, args=(), dictionary=False):
+    pool = await get_async_pool()
+    cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+    async with pool.acquire() as conn:
+        async with conn.cursor(cursor_class) as cursor:
+            started = time.perf_counter()
+            await cursor.execute(sql, args)
+            rows = await cursor.fetchall()
+            record_query(sql, time.perf_counter() - started, len(rows))
+        # End the read transaction so pooled connections don't hold stale snapshots.
+        await conn.rollback()
+    return rows
+
+
+async def fetchone(sql, args=(), dictionary=False):
+    rows = await fetchall(sql, args, dictionary)
+    return rows[0] if rows else None
+
+
+async def execute(sql, args=()):
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            started = time.perf_counter()
+            await cursor.execute(sql, args)
+            record_query(sql, time.perf_counter() - started)
+            rowcount = cursor.rowcount
+        await conn.commit()
+    return rowcount
+
+
+async def execute_in_transaction(statements):
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        try:
+            async with conn.cursor() as cursor:
+                for sql, args in statements:
+                    started = time.perf_counter()
+                    await cursor.execute(sql, args)
+                    record_query(sql, time.perf_counter() - started)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+
+
+def async_pool_stats():
+    if _pool is None:
+        return {"size": 0, "free": 0, "in_use": 0}
+    return {
+        "size": _pool.size,
+        "free": _pool.freesize,
+        "in_use": _pool.size - _pool.freesize,
+    }
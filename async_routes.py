@@ -0,0 +1,181 @@
+import asyncio
+import json
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Request, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.templating import Jinja2Templates
+
+import async_db
+from jobs import job_queue
+from encryption import fernet
+from decrypt_cache import decrypt_cache
+from batch_decrypt import decrypt_batch
+from log_stats import record_log_query
+from write_buffer import log_write_buffer, LOG_WRITE_BUFFER, LOG_WRITE_TIMEOUT
+from search_index import index_log_query
+from repository import content_version_query, content_version_lookup
+from page_cache import cached_page_async
+from admin import dashboard_query, dashboard_context, ADMIN_PAGE_SIZE
+from utils import log_page_query, split_log_page, clamp_page_size, LOG_PAGE_SIZE
+
+load_dotenv()
+
+router = APIRouter()
+templates = Jinja2Templates(directory="templates")
+
+
+def _decrypt_logs(rows, username):
+    decrypted = decrypt_batch(
+        fernet, [row[2] for row in rows],
+        row_ids=[row[0] for row in rows], table="daily_logs", owner=username
+    )
+    return [(row[1], entry) for row, entry in zip(rows, decrypted)]
+
+
+def _decrypt_summaries(rows, username):
+    decrypted = decrypt_batch(
+        fernet, [row[3] for row in rows],
+        row_ids=[row[0] for row in rows], table="weekly_summaries", owner=username,
+        placeholder="[Error decrypting summary]"
+    )
+    return [(row[1], row[2], summary) for row, summary in zip(rows, decrypted)]
+
+
+@router.get("/", response_class=HTMLResponse)
+async def home(request: Request, cursor: str = None, page_size: int = LOG_PAGE_SIZE):
+    if "username" not in request.session:
+        return templates.TemplateResponse("home.html", {"request": request})
+
+    username = request.session["username"]
+    page_size = clamp_page_size(page_size)
+
+    async def render():
+        sql, args = log_page_query(username, cursor, page_size)
+        rows, next_cursor = split_log_page(await async_db.fetchall(sql, args), page_size)
+        # Decryption is CPU-bound; keep it off the event loop.
+        logs = await run_in_threadpool(_decrypt_logs, rows, username)
+
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "logs": logs,
+            "next_cursor": next_cursor,
+            "page_size": page_size,
+            "is_first_page": cursor is None
+        })
+
+    # Same ETags as the sync routes in main.py
+    stamp = await async_db.fetchone(*content_version_lookup(username))
+    if stamp is None:
+        return await render()
+    return await cached_page_async(request, stamp, ("home", username, cursor, page_size), render)
+
+
+@router.get("/summaries", response_class=HTMLResponse)
+async def view_summaries(request: Request, job: str = None):
+    if "username" not in request.session:
+        return RedirectResponse("/login", status_code=302)
+
+    username = request.session["username"]
+    # The job queue is SQLite; keep its blocking calls off the event loop.
+    current_job = await run_in_threadpool(job_queue.current_for, username, "weekly_summary", job)
+
+    async def render():
+        rows = await async_db.fetchall(
+            "SELECT id, week_start, week_end, summary FROM weekly_summaries WHERE username = %s ORDER BY week_start DESC",
+            (username,)
+        )
+        summaries = await run_in_threadpool(_decrypt_summaries, rows, username)
+
+        return templates.TemplateResponse("summary.html", {
+            "request": request,
+            "summaries": summaries,
+            "job": current_job
+        })
+
+    stamp = await async_db.fetchone(*content_version_lookup(username))
+    if stamp is None:
+        return await render()
+    job_state = None
+    if current_job:
+        job_state = (current_job["id"], current_job["status"], json.dumps(current_job["result"], sort_keys=True, default=str))
+    return await cached_page_async(
+        request, stamp, ("summaries", username, job_state), render, use_last_modified=current_job is None
+    )
+
+
+@router.post("/log")
+async def add_log(request: Request, log_date: str = Form(...), entry: str = Form(...)):
+    if "username" not in request.session:
+        return RedirectResponse("/login", status_code=302)
+
+    username = request.session["username"]
+    encrypted_entry = fernet.encrypt(entry.encode()).decode()
+
+    if LOG_WRITE_BUFFER:
+        await asyncio.wait_for(
+            asyncio.wrap_future(log_write_buffer.submit(log_date, encrypted_entry, username, entry)),
+            LOG_WRITE_TIMEOUT
+        )
+    else:
+        statements = [
+            ("INSERT INTO daily_logs (log_date, entry, username) VALUES (%s, %s, %s)",
+             (log_date, encrypted_entry, username)),
+            # Uses LAST_INSERT_ID(), so it has to follow the daily_logs insert
+            index_log_query(username, entry),
+            record_log_query(username, log_date),
+            content_version_query(username),
+        ]
+        await async_db.execute_in_transaction([statement for statement in statements if statement])
+    decrypt_cache.invalidate_owner(username)
+
+    return RedirectResponse("/", status_code=302)
+
+
+@router.get("/admin", response_class=HTMLResponse)
+async def admin_dashboard(request: Request, q: str = "", sort: str = "username", direction: str = "asc", page: int = 1):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    q = q.strip()
+    page = max(1, page)
+    page_query, count_query = dashboard_query(q, sort, direction, page, ADMIN_PAGE_SIZE)
+    users = await async_db.fetchall(*page_query, dictionary=True)
+    total = (await async_db.fetchone(*count_query, dictionary=True))["total"]
+
+    return templates.TemplateResponse(
+        "admin_dashboard.html",
+        dashboard_context(request, users, total, q, sort, direction, page, ADMIN_PAGE_SIZE)
+    )
+
+
+@router.get("/admin/user-logs/{username}", response_class=HTMLResponse)
+async def view_user_logs(username: str, request: Request, cursor: str = None, page_size: int = LOG_PAGE_SIZE):
+    if not request.session.get("is_admin"):
+        return RedirectResponse("/admin-login", status_code=302)
+
+    page_size = clamp_page_size(page_size)
+
+    async def render():
+        sql, args = log_page_query(username, cursor, page_size)
+        rows, next_cursor = split_log_page(await async_db.fetchall(sql, args), page_size)
+        logs = [
+            {"log_date": log_date, "entry": entry}
+            for log_date, entry in await run_in_threadpool(_decrypt_logs, rows, username)
+        ]
+
+        return templates.TemplateResponse("admin_user_logs.html", {
+            "request": request,
+            "logs": logs,
+            "username": username,
+            "next_cursor": next_cursor,
+            "page_size": page_size,
+            "is_first_page": cursor is None,
+            "error": "user not found"
+        })
+
+    stamp = await async_db.fetchone(*content_version_lookup(username))
+    if stamp is None:
+        return await render()
+    return await cached_page_async(request, stamp, ("admin-user-logs", username, cursor, page_size), render)
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from decrypt_cache import decrypt_cache, cache_key
+from metrics import record_decrypt
+
+load_dotenv()
+
+PARALLEL_THRESHOLD = int(os.getenv("DECRYPT_PARALLEL_THRESHOLD", "64"))
+CHUNK_SIZE = int(os.getenv("DECRYPT_CHUNK_SIZE", "32"))
+WORKERS = int(os.getenv("DECRYPT_WORKERS", str(min(8, os.cpu_count() or 1))))
+EXECUTOR_KIND = os.getenv("DECRYPT_EXECUTOR", "thread")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"batches": 0, "parallel_batches": 0, "rows": 0, "cache_hits": 0, "failures": 0, "seconds": 0.0}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if EXECUTOR_KIND == "process":
+                    _executor = ProcessPoolExecutor(max_workers=WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="decrypt")
+    return _executor
+
+
+def _decrypt_chunk(fernet, ciphertexts):
+    # Module level so it can be pickled into a process pool.
+    results = []
+    for ciphertext in ciphertexts:
+        try:
+            results.append((True, fernet.decrypt(ciphertext.encode()).decode()))
+        except Exception as exc:
+            results.append((False, f"{type(exc).__name__}: {exc}"))
+    return results
+
+
+class BatchResult:
+    def __init__(self, values, errors, elapsed, cache_hits, parallel):
+        self.values = values
+        # [(index, error message)] for rows that failed to decrypt
+        self.errors = errors
+        self.elapsed = elapsed
+        self.cache_hits = cache_hits
+        self.parallel = parallel
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+def decrypt_batch(fernet, ciphertexts, row_ids=None, table=None, owner=None, placeholder="[Error decrypting entry]"):
+    started = time.perf_counter()
+    values = [None] * len(ciphertexts)
+    errors = []
+    cache_hits = 0
+
+    pending = []
+    for index, ciphertext in enumerate(ciphertexts):
+        if table is not None and row_ids is not None:
+            plaintext = decrypt_cache.get(cache_key(table, row_ids[index], ciphertext))
+            if plaintext is not None:
+                values[index] = plaintext
+                cache_hits += 1
+                continue
+        pending.append(index)
+
+    parallel = len(pending) >= PARALLEL_THRESHOLD and WORKERS > 1
+    chunks = [pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)]
+    if parallel:
+        executor = _get_executor()
+        futures = [executor.submit(_decrypt_chunk, fernet, [ciphertexts[i] for i in chunk]) for chunk in chunks]
+        chunk_results = [future.result() for future in futures]
+    else:
+        chunk_results = [_decrypt_chunk(fernet, [ciphertexts[i] for i in chunk]) for chunk in chunks]
+
+    for chunk, results in zip(chunks, chunk_results):
+        for index, (ok, value) in zip(chunk, results):
+            if ok:
+                values[index] = value
+                if table is not None and row_ids is not None:
+                    decrypt_cache.put(cache_key(table, row_ids[index], ciphertexts[index]), value, owner)
+            else:
+                values[index] = placeholder
+                errors.append((index, value))
+
+    elapsed = time.perf_counter() - started
+    record_decrypt(elapsed, len(ciphertexts))
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["parallel_batches"] += parallel
+        _stats["rows"] += len(ciphertexts)
+        _stats["cache_hits"] += cache_hits
+        _stats["failures"] += len(errors)
+        _stats["seconds"] += elapsed
+
+    return BatchResult(values, errors, elapsed, cache_hits, parallel)
+
+
+def batch_stats():
+    with _stats_lock:
+        return dict(_stats)
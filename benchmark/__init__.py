@@ -0,0 +1,9 @@
+# Seeded accounts all start with USER_PREFIX so a reseed only ever touches
+# benchmark rows. Kept here so the load driver doesn't import the database layer.
+USER_PREFIX = "bench_"
+ADMIN_USERNAME = "bench_admin"
+PASSWORD = "benchmark-password"
+
+
+def username_for(index):
+    return f"{USER_PREFIX}user_{index:05d}"
@@ -0,0 +1,151 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+# Everything runs on one machine with no network access:
+#
+#   python -m benchmark seed --users 200 --logs-per-user 90 --reset
+#   python -m benchmark run --start-app --duration 60 --output results.json
+#   python -m benchmark run --start-app --baseline baseline.json      # exits 1 on regression
+#   python -m benchmark compare results.json baseline.json
+#
+# --start-app launches uvicorn with the fake model (fake_model.py) as the
+# OpenAI endpoint and the login throttle opened up; without it, point
+# --base-url at an app you started yourself with the same settings.
+#
+# With STORAGE_BACKEND=sqlite (see repository.py) seeding and the app use an
+# embedded database file, so no MySQL server is needed either.
+
+load_dotenv()
+# Benchmark data needs no real secrets; seeding and the app share these.
+os.environ.setdefault("SEARCH_INDEX_KEY", "benchmark")
+os.environ.setdefault("LLM_CACHE_KEY", "benchmark")
+
+
+def _start_fake_model(port):
+    from fake_model import serve
+    server = serve("127.0.0.1", port, latency=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _start_app(port, model_port):
+    env = dict(
+        os.environ,
+        OPENAI_API_BASE=f"http://127.0.0.1:{model_port}/v1",
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY") or "benchmark",
+        LOGIN_MAX_ATTEMPTS_PER_USER="1000000",
+        LOGIN_MAX_ATTEMPTS_PER_IP="1000000",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/login", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            if process.poll() is not None:
+                raise SystemExit("❌ The app exited during startup")
+            time.sleep(0.25)
+    process.terminate()
+    raise SystemExit("❌ The app did not start within 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Seed data and load-test the worklog app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="create benchmark users, logs and summaries")
+    seed_parser.add_argument("--users", type=int, default=100)
+    seed_parser.add_argument("--logs-per-user", type=int, default=60)
+    seed_parser.add_argument("--summary-weeks", type=int, default=8)
+    seed_parser.add_argument("--seed", type=int, default=42, help="random seed, for identical data across runs")
+    seed_parser.add_argument("--reset", action="store_true", help="delete earlier benchmark rows first")
+
+    run_parser = commands.add_parser("run", help="drive the app's routes at fixed concurrency")
+    run_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--start-app", action="store_true", help="start the app and a fake model locally")
+    run_parser.add_argument("--port", type=int, default=8099, help="app port with --start-app")
+    run_parser.add_argument("--model-port", type=int, default=8765, help="fake model port with --start-app")
+    run_parser.add_argument("--users", type=int, default=100, help="seeded users to spread traffic over")
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before that")
+    run_parser.add_argument("--mix", help='route weights, e.g. "GET /=50,POST /log=50"')
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="write results JSON here")
+    run_parser.add_argument("--baseline", help="compare against this results JSON")
+    run_parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("--tolerance", type=float, default=0.15)
+
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        from benchmark.seed import seed, reset
+        if args.reset:
+            reset()
+        seed(args.users, args.logs_per_user, args.summary_weeks, args.seed)
+        return 0
+
+    from benchmark.report import summarize, print_results, compare, load_results, save_results
+
+    if args.command == "compare":
+        regressions = compare(load_results(args.results), load_results(args.baseline), args.tolerance)
+    else:
+        from benchmark.load import run_load, parse_mix, DEFAULT_MIX
+        mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+        process = server = None
+        base_url = args.base_url
+        if args.start_app:
+            server = _start_fake_model(args.model_port)
+            process, base_url = _start_app(args.port, args.model_port)
+        try:
+            print(f"🚀 {args.concurrency} clients against {base_url} for {args.duration:.0f}s "
+                  f"(+{args.warmup:.0f}s warm-up)")
+            samples, errors, duration = run_load(
+                base_url, args.users, args.concurrency, args.duration, args.warmup, mix, args.seed
+            )
+        finally:
+            if process:
+                process.terminate()
+                process.wait(10)
+            if server:
+                server.shutdown()
+
+        results = summarize(samples, errors, duration, {
+            "concurrency": args.concurrency, "duration": args.duration, "users": args.users,
+            "mix": mix, "seed": args.seed,
+        })
+        print_results(results)
+        if args.output:
+            save_results(results, args.output)
+            print(f"💾 Results saved to {args.output}")
+        if not args.baseline:
+            return 0
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+
+    if regressions:
+        print("❌ Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+
+import requests
+
+from benchmark import ADMIN_USERNAME, PASSWORD, username_for
+
+# Weighted route mix; names are the labels results are reported under.
+DEFAULT_MIX = {
+    "GET /": 30,
+    "POST /log": 15,
+    "GET /summaries": 15,
+    "GET /admin": 10,
+    "GET /admin/user-logs/{username}": 10,
+    "POST /login": 5,
+    "POST /generate-summary": 5,
+}
+
+
+def parse_mix(text):
+    # "GET /=30,POST /log=10"
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.rpartition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class VirtualUser:
+    def __init__(self, base_url, index, users, rng):
+        self.base_url = base_url
+        self.username = username_for(index % users)
+        self.users = users
+        self.rng = rng
+        self.session = requests.Session()
+        self.admin = requests.Session()
+
+    def _timed(self, session, method, path, **kwargs):
+        started = time.perf_counter()
+        response = session.request(method, self.base_url + path, allow_redirects=False, timeout=60, **kwargs)
+        elapsed = time.perf_counter() - started
+        # Redirects are the expected answer for form posts; anything else >= 400 is an error
+        return elapsed, response.status_code < 400
+
+    def login(self):
+        elapsed, ok = self._timed(self.session, "POST", "/login", data={"username": self.username, "password": PASSWORD})
+        self._timed(self.admin, "POST", "/admin-login", data={"username": ADMIN_USERNAME, "password": PASSWORD})
+        return elapsed, ok
+
+    def run(self, name):
+        if name == "GET /":
+            return self._timed(self.session, "GET", "/")
+        if name == "POST /log":
+            entry = f"Benchmark entry {self.rng.random():.6f}: reviewed the release and fixed a bug."
+            return self._timed(self.session, "POST", "/log", data={"log_date": date.today().isoformat(), "entry": entry})
+        if name == "GET /summaries":
+            return self._timed(self.session, "GET", "/summaries")
+        if name == "GET /admin":
+            return self._timed(self.admin, "GET", "/admin")
+        if name == "GET /admin/user-logs/{username}":
+            return self._timed(self.admin, "GET", f"/admin/user-logs/{username_for(self.rng.randrange(self.users))}")
+        if name == "POST /login":
+            return self._timed(requests.Session(), "POST", "/login",
+                               data={"username": self.username, "password": PASSWORD})
+        if name == "POST /generate-summary":
+            return self._timed(self.session, "POST", "/generate-summary")
+        raise ValueError(f"Unknown route in mix: {name}")
+
+
+def run_load(base_url, users, concurrency=10, duration=30.0, warmup=5.0, mix=None, seed_value=1):
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rng = random.Random(seed_value * 1000 + index)
+        user = VirtualUser(base_url, index, users, rng)
+        user.login()
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            try:
+                elapsed, ok = user.run(name)
+            except requests.RequestException:
+                elapsed, ok = time.perf_counter() - now, False
+            if now < start_at:
+                continue  # warm-up traffic is not measured
+            with lock:
+                samples[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, duration
@@ -0,0 +1,74 @@
+import json
+import math
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, errors, duration, config):
+    routes = {}
+    all_values = []
+    for name, values in samples.items():
+        values = sorted(values)
+        all_values += values
+        routes[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "throughput": len(values) / duration,
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    all_values.sort()
+    total = {
+        "count": len(all_values),
+        "errors": sum(errors.values()),
+        "throughput": len(all_values) / duration,
+        "p50_ms": percentile(all_values, 50) * 1000,
+        "p95_ms": percentile(all_values, 95) * 1000,
+        "p99_ms": percentile(all_values, 99) * 1000,
+    }
+    return {"config": config, "routes": routes, "total": total}
+
+
+def print_results(results):
+    print(f"{'route':<34} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = sorted(results["routes"].items()) + [("TOTAL", results["total"])]
+    for name, stats in rows:
+        print(f"{name:<34} {stats['count']:>7} {stats['errors']:>5} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+def compare(results, baseline, tolerance=0.15, noise_ms=5.0):
+    # A route regresses when its p95 or p99 grows by more than `tolerance` (and
+    # by more than noise_ms, so sub-millisecond jitter is ignored), when its
+    # throughput drops by more than `tolerance`, or when it starts erroring.
+    regressions = []
+    for name, current in sorted(results["routes"].items()) + [("TOTAL", results["total"])]:
+        before = baseline["total"] if name == "TOTAL" else baseline["routes"].get(name)
+        if before is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if current[key] > before[key] * (1 + tolerance) and current[key] - before[key] > noise_ms:
+                regressions.append(f"{name}: {key} {before[key]:.1f} → {current[key]:.1f}")
+        if current["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']:.1f} → {current['throughput']:.1f} req/s")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} → {current['errors']}")
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_results(results, path):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
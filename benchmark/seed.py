@@ -0,0 +1,78 @@
+import random
+import time
+from datetime import date, timedelta
+
+from passlib.context import CryptContext
+
+from log_stats import week_start_for
+from logwork import _encrypt_rows, _insert_rows
+from repository import repository
+from weekly_summary import save_summaries_bulk
+from benchmark import USER_PREFIX, ADMIN_USERNAME, PASSWORD, username_for
+
+# Synthetic, deterministic data for benchmarking.
+
+WORDS = (
+    "reviewed fixed deployed wrote tested refactored paired planned debugged documented migrated "
+    "api dashboard login summary schema index query cache pipeline release ticket customer "
+    "report latency bug feature meeting design sprint backlog service worker database frontend"
+).split()
+
+
+def _entry(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))).capitalize() + "."
+
+
+def reset():
+    pattern = USER_PREFIX.replace("_", "!_") + "%"
+    with repository.transaction() as cursor:
+        for table in ("log_search_index", "daily_logs", "weekly_summaries", "user_log_stats", "users"):
+            cursor.execute(f"DELETE FROM {table} WHERE username LIKE %s ESCAPE '!'", (pattern,))
+
+
+def seed(users=100, logs_per_user=60, summary_weeks=8, seed_value=42, batch_size=1000, report=print):
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+
+    # One real bcrypt hash shared by every account: logins still pay the full
+    # verify cost, but seeding thousands of users doesn't take minutes.
+    hashed = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    repository.create_users([
+        (username_for(i), hashed, f"Bench{i}", f"User{i:05d}", f"{username_for(i)}@example.com", "555-0100", False)
+        for i in range(users)
+    ] + [(ADMIN_USERNAME, hashed, "Bench", "Admin", f"{ADMIN_USERNAME}@example.com", "555-0100", True)])
+    report(f"👤 {users} users and {ADMIN_USERNAME} ready")
+
+    # Logs go through the same encrypt + insert + indexing + counters path as logwork import
+    today = date.today()
+    batch, total = [], 0
+    for i in range(users):
+        for day in range(logs_per_user):
+            batch.append((username_for(i), today - timedelta(days=day), _entry(rng)))
+            if len(batch) >= batch_size:
+                _insert_rows(_encrypt_rows(batch), batch)
+                total += len(batch)
+                batch = []
+        if (i + 1) % 100 == 0:
+            report(f"… {total} logs for {i + 1} users")
+    if batch:
+        _insert_rows(_encrypt_rows(batch), batch)
+        total += len(batch)
+    report(f"📝 {total} logs")
+
+    # Past weeks only, so /generate-summary still has a current week to work on
+    this_week = week_start_for(today)
+    rows = []
+    for i in range(users):
+        for week in range(1, summary_weeks + 1):
+            start = this_week - timedelta(weeks=week)
+            rows.append((start, start + timedelta(days=6), "\n".join(f"- {_entry(rng)}" for _ in range(5)),
+                         username_for(i), None))
+            if len(rows) >= batch_size:
+                save_summaries_bulk(rows)
+                rows = []
+    if rows:
+        save_summaries_bulk(rows)
+    report(f"📋 {users * summary_weeks} summaries")
+
+    report(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+from cryptography.fernet import Fernet
+
+# The app modules read their settings at import time, so point them at
+# throwaway SQLite files and test secrets before any test imports them.
+_data_dir = tempfile.mkdtemp(prefix="worklog-tests-")
+os.environ.update(
+    STORAGE_BACKEND="sqlite",
+    SQLITE_PATH=os.path.join(_data_dir, "worklog.sqlite3"),
+    JOBS_DB_PATH=os.path.join(_data_dir, "jobs.sqlite3"),
+    LLM_CACHE_PATH=os.path.join(_data_dir, "llm_cache.sqlite3"),
+    ENCRYPTION_KEYS=Fernet.generate_key().decode(),
+    SEARCH_INDEX_KEY="test-search-index-key",
+    LLM_CACHE_KEY="test-llm-cache-key",
+    SESSION_SECRET="test-session-secret",
+    SECRET_KEY="test-secret-key",
+)
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+from metrics import TimedCursor
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, connect_args, size=10, timeout=5.0, recycle=1800, ping_interval=30):
+        self.connect_args = connect_args
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+
+        self.in_use = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.checkouts = 0
+        self.reconnects = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def _connect(self):
+        return PooledConnection(self, mysql.connector.connect(**self.connect_args), time.monotonic())
+
+    def _discard(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, idle_since):
+        if self.recycle and time.monotonic() - conn.created_at > self.recycle:
+            return False
+        # Skip the round trip for connections that were handed back moments ago.
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def connection(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            with self._cond:
+                while not self._idle and self._opened >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, None
+                    self._opened += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opened -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(conn, idle_since):
+                self._discard(conn)
+                with self._cond:
+                    self._opened -= 1
+                    self.reconnects += 1
+                    self._cond.notify()
+                continue
+
+            conn._closed = False
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self.in_use += 1
+                self.checkouts += 1
+                self.checkout_time_total += elapsed
+                self.checkout_time_max = max(self.checkout_time_max, elapsed)
+            return conn
+
+    def release(self, conn):
+        try:
+            # Drop any open transaction/snapshot so the next borrower sees fresh data.
+            conn._raw.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self.in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._opened -= 1
+            self._cond.notify()
+
+        if not healthy:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "in_use": self.in_use,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "checkouts": self.checkouts,
+                "reconnects": self.reconnects,
+                "checkout_avg_ms": (self.checkout_time_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                "checkout_max_ms": self.checkout_time_max * 1000,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect_args={
+                        "host": os.getenv("DB_HOST"),
+                        "port": int(os.getenv("DB_PORT", "3306")),
+                        "user": os.getenv("DB_USER"),
+                        "password": os.getenv("DB_PASSWORD"),
+                        "database": os.getenv("DB_NAME"),
+                    },
+                    size=int(os.getenv("DB_POOL_SIZE", "10")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+                    recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+                    ping_interval=float(os.getenv("DB_POOL_PING_INTERVAL", "30")),
+                )
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats()
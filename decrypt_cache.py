@@ -0,0 +1,105 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class DecryptCache:
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (plaintext, size, expires_at, owner), oldest first
+        self._entries = OrderedDict()
+        self._by_owner = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, key):
+        plaintext, size, expires_at, owner = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_owner[owner]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, plaintext, owner=None):
+        size = sys.getsizeof(plaintext)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (plaintext, size, time.monotonic() + self.ttl, owner)
+            self._by_owner.setdefault(owner, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_owner(self, owner):
+        with self._lock:
+            for key in list(self._by_owner.get(owner, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_owner.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+decrypt_cache = DecryptCache(
+    max_bytes=int(os.getenv("DECRYPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("DECRYPT_CACHE_TTL", "3600")),
+)
+
+
+def cache_key(table, row_id, ciphertext):
+    # The ciphertext digest keeps a re-encrypted row from serving stale plaintext.
+    return (table, row_id, hashlib.blake2b(ciphertext.encode(), digest_size=16).digest())
+
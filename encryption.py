@@ -0,0 +1,27 @@
+import hashlib
+import os
+
+from cryptography.fernet import Fernet, MultiFernet
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ENCRYPTION_KEYS is a comma-separated list, newest first: the first key
+# encrypts, every key can decrypt. To rotate, put the new key in front, restart,
+# run the re-encryption job (rekey.py), then drop the old key.
+# A lone ENCRYPTION_KEY still works for setups that never rotated.
+# The search index has its own SEARCH_INDEX_KEY (search_index.py), which is
+# independent of these keys and stays the same across a rotation; no index
+# rebuild is needed.
+
+def _load_keys():
+    keys = os.getenv("ENCRYPTION_KEYS") or os.getenv("ENCRYPTION_KEY")
+    return [key.strip() for key in keys.split(",") if key.strip()]
+
+ENCRYPTION_KEYS = _load_keys()
+
+primary_fernet = Fernet(ENCRYPTION_KEYS[0].encode())
+fernet = MultiFernet([Fernet(key.encode()) for key in ENCRYPTION_KEYS])
+
+# Identifies the current primary key without revealing it
+PRIMARY_KEY_ID = hashlib.sha256(ENCRYPTION_KEYS[0].encode()).hexdigest()[:16]
@@ -0,0 +1,118 @@
+import argparse
+import hashlib
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for the OpenAI chat completions API so summaries can be generated
+# and load-tested with no network access. Point the app at it with
+# OPENAI_API_BASE=http://127.0.0.1:8765/v1 (or weekly_summary.py --model-base-url).
+
+
+def fake_summary(prompt):
+    lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+    digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+    bullets = "\n".join(f"- {line[:80]}" for line in lines[-5:])
+    return (
+        f"{bullets}\n\n"
+        f"Summary ({digest}): steady progress across {len(lines)} noted items this week."
+    )
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_delay = 0.02
+    rate_limit_every = 0
+    counter = itertools.count(1)
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.lock:
+            number = next(self.counter)
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            headers={"Retry-After": "1"})
+            return
+
+        time.sleep(self.latency)
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = fake_summary(prompt)
+        if request.get("stream"):
+            self._stream(number, request.get("model", "fake"), content)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{number}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        })
+
+    def _stream(self, number, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-fake-{number}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        final = {"id": f"chatcmpl-fake-{number}", "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+
+
+def serve(host="127.0.0.1", port=8765, latency=0.0, rate_limit_every=0):
+    FakeModelHandler.latency = latency
+    FakeModelHandler.rate_limit_every = rate_limit_every
+    server = ThreadingHTTPServer((host, port), FakeModelHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to wait before answering")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.rate_limit_every)
+    print(f"🤖 Fake model listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+from metrics import record_bcrypt
+
+load_dotenv()
+
+# bcrypt is deliberately slow, so it gets its own bounded pool instead of the
+# request threadpool. HASH_MAX_PENDING caps queued + running work; beyond it
+# callers get HashingBusy straight away rather than waiting.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 4)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+BUSY_ERROR = "The server is busy right now. Please try again in a moment."
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _call(operation, *args):
+    # Runs in the worker; wall-clock stamps let the caller split queue and run time.
+    started = time.time()
+    if operation == "hash":
+        result = pwd_context.hash(*args)
+    else:
+        result = pwd_context.verify(*args)
+    return started, result, time.time()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "in_flight": 0,
+    "completed": 0,
+    "rejected": 0,
+    "queue_seconds": 0.0,
+    "queue_seconds_max": 0.0,
+    "run_seconds": 0.0,
+}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if HASH_EXECUTOR == "process":
+                    _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def _run(operation, *args):
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HashingBusy("Too many password operations in progress")
+
+    with _stats_lock:
+        _stats["in_flight"] += 1
+    try:
+        submitted = time.time()
+        started, result, finished = _get_executor().submit(_call, operation, *args).result()
+    finally:
+        _slots.release()
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+
+    record_bcrypt(operation, time.time() - submitted)
+    with _stats_lock:
+        _stats["completed"] += 1
+        _stats["queue_seconds"] += max(0.0, started - submitted)
+        _stats["queue_seconds_max"] = max(_stats["queue_seconds_max"], started - submitted)
+        _stats["run_seconds"] += finished - started
+    return result
+
+
+def hash_password(password):
+    return _run("hash", password)
+
+
+def verify_password(password, hashed):
+    return _run("verify", password, hashed)
+
+
+def hashing_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["workers"] = HASH_WORKERS
+    stats["max_pending"] = HASH_MAX_PENDING
+    return stats
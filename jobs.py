@@ -0,0 +1,329 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Jobs live in a local SQLite file so the queue needs no external services and
+# survives restarts. Any process sharing the file can run workers; claiming a
+# job happens inside BEGIN IMMEDIATE so two workers never take the same one.
+# A running job holds a lease: its worker refreshes updated_at every lease/3
+# seconds, and any worker puts a job whose lease ran out back on the queue, so
+# a crashed process never leaves work stuck in RUNNING.
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+
+
+class JobQueue:
+    def __init__(self, path, concurrency=2, max_attempts=3, backoff=5.0, poll_interval=1.0, lease=60.0):
+        self.path = path
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+
+        self._handlers = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Condition()
+        self._reclaim_lock = threading.Lock()
+        # job id -> heartbeat stop event for start_inline jobs
+        self._inline = {}
+        self._inline_lock = threading.Lock()
+        self._next_reclaim = 0.0
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner_kind ON jobs (owner, kind, created_at)")
+        conn.close()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def enqueue(self, kind, payload, owner=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, owner, payload, status, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, owner, json.dumps(payload), PENDING, now, now, now)
+        )
+        conn.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def get(self, job_id):
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return self._row_to_job(row)
+
+    def _lease_expired(self, job):
+        return job["status"] == RUNNING and job["updated_at"] < time.time() - self.lease
+
+    def active_for(self, owner, kind):
+        # A RUNNING row whose lease ran out belongs to a dead worker; it is not
+        # in flight until a worker reclaims it.
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE owner = ? AND kind = ? "
+            "AND (status = ? OR (status = ? AND updated_at >= ?)) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (owner, kind, PENDING, RUNNING, time.time() - self.lease)
+        ).fetchone()
+        conn.close()
+        return self._row_to_job(row)
+
+    def current_for(self, owner, kind, job_id=None):
+        # The job the owner asked about (if it is theirs), else whatever is still in flight.
+        job = self.get(job_id) if job_id else None
+        if job is None or job["owner"] != owner or job["kind"] != kind or self._lease_expired(job):
+            job = self.active_for(owner, kind)
+        return job
+
+    def start_inline(self, kind, payload, owner):
+        # For work run in the caller's own thread (e.g. a streamed response)
+        # that must still count as in flight for active_for. Returns the job,
+        # already RUNNING and heartbeating, or None when the owner has one of
+        # this kind pending or running. If the caller's process dies, the lease
+        # runs out and a worker picks the job up like any other.
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            active = conn.execute(
+                "SELECT 1 FROM jobs WHERE owner = ? AND kind = ? "
+                "AND (status = ? OR (status = ? AND updated_at >= ?)) LIMIT 1",
+                (owner, kind, PENDING, RUNNING, now - self.lease)
+            ).fetchone()
+            if active is not None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, payload, status, attempts, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                (job_id, kind, owner, json.dumps(payload), RUNNING, now, now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        job = self.get(job_id)
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+        with self._inline_lock:
+            self._inline[job_id] = done
+        return job
+
+    def finish_inline(self, job, result=None, error=None):
+        with self._inline_lock:
+            done = self._inline.pop(job["id"], None)
+        if done is not None:
+            done.set()
+        if error is None:
+            self._finish(job, COMPLETE, result=result)
+        else:
+            self._finish(job, FAILED, error=error)
+
+    def _claim(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND run_after <= ? ORDER BY run_after LIMIT 1",
+                (PENDING, time.time())
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+            job = self._row_to_job(row)
+            job["attempts"] += 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job, status, result=None, error=None, run_after=None):
+        # Only the attempt that holds the lease may finish the job; a worker
+        # whose lease was reclaimed finds the row changed and does nothing.
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, run_after = COALESCE(?, run_after), updated_at = ? "
+            "WHERE id = ? AND status = ? AND attempts = ?",
+            (status, json.dumps(result) if result is not None else None, error, run_after, time.time(),
+             job["id"], RUNNING, job["attempts"])
+        )
+        conn.close()
+
+    def _heartbeat(self, job, done):
+        while not done.wait(self.lease / 3):
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                    (time.time(), job["id"], RUNNING, job["attempts"])
+                )
+                conn.close()
+            except sqlite3.OperationalError:
+                # Busy database; the next beat is still well inside the lease
+                pass
+
+    def _reclaim(self):
+        # Jobs whose worker stopped heartbeating go back on the queue, or fail
+        # once they have used up their attempts.
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, "Worker lease expired", now, RUNNING, now - self.lease, self.max_attempts)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (PENDING, now, now, RUNNING, now - self.lease)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _maybe_reclaim(self):
+        with self._reclaim_lock:
+            if time.time() < self._next_reclaim:
+                return
+            self._next_reclaim = time.time() + self.lease / 3
+        try:
+            self._reclaim()
+        except sqlite3.OperationalError:
+            pass
+
+    def _run(self, job):
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            self._finish(job, FAILED, error=f"No handler registered for {job['kind']}")
+            return
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job["payload"])
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            if job["attempts"] < self.max_attempts:
+                # Exponential backoff with jitter before the next attempt
+                delay = self.backoff * (2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+                self._finish(job, PENDING, error=error, run_after=time.time() + delay)
+            else:
+                self._finish(job, FAILED, error=error)
+            return
+        finally:
+            done.set()
+            heartbeat.join()
+        self._finish(job, COMPLETE, result=result)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            self._maybe_reclaim()
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError:
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        conn = self._connect()
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        conn.close()
+        stats = {status: 0 for status in (PENDING, RUNNING, COMPLETE, FAILED)}
+        stats.update({row[0]: row[1] for row in rows})
+        stats["workers"] = len(self._threads)
+        return stats
+
+
+job_queue = JobQueue(
+    os.getenv("JOBS_DB_PATH", "jobs.sqlite3"),
+    concurrency=int(os.getenv("JOB_WORKERS", "2")),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    backoff=float(os.getenv("JOB_RETRY_BACKOFF", "5")),
+    lease=float(os.getenv("JOB_LEASE_SECONDS", "60")),
+)
@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+from encryption import fernet
+
+load_dotenv()
+
+
+class SummaryCache:
+    # Content-addressed store of model outputs. Values are Fernet-encrypted at
+    # rest because they are derived from users' private logs, and keys are an
+    # HMAC under secret so they can't be matched against guessed log text.
+    def __init__(self, path, fernet, secret, ttl, max_bytes):
+        self.path = path
+        self.fernet = fernet
+        self.secret = secret
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def key(self, model, system_prompt, prompt_version, text):
+        # Checked here rather than at import so the app still starts without it
+        if not self.secret:
+            raise RuntimeError("LLM_CACHE_KEY is not set; generate one with: python -c \"import secrets; print(secrets.token_hex(32))\"")
+        material = json.dumps([model, system_prompt, prompt_version, text], ensure_ascii=False)
+        return hmac.new(self.secret, material.encode(), hashlib.sha256).hexdigest()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now - self.ttl:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.close()
+            self._count("misses")
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        conn.close()
+        try:
+            value = self.fernet.decrypt(row[0].encode()).decode()
+        except Exception:
+            # Written under a key that has since been retired; treat as a miss.
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        encrypted = self.fernet.encrypt(value.encode()).decode()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, encrypted, len(encrypted), now, now)
+        )
+        self._evict(conn, now)
+        conn.close()
+
+    def _evict(self, conn, now):
+        evicted = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.max_bytes:
+            # Drop least recently used entries until back under the cap.
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+            evicted += len(doomed)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def stats(self):
+        conn = self._connect()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# Changing LLM_CACHE_KEY only turns existing entries into misses; they age out.
+summary_cache = SummaryCache(
+    os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3"),
+    fernet,
+    (os.getenv("LLM_CACHE_KEY") or "").encode(),
+    ttl=float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600))),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+)
@@ -0,0 +1,94 @@
+import argparse
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+from utils import get_db_connection
+
+# user_log_stats keeps one row per user so the admin dashboard never has to
+# count daily_logs. Writers update it in the same transaction as their insert;
+# reconcile repairs it from daily_logs.
+
+def week_start_for(day):
+    return day - timedelta(days=day.weekday())
+
+def record_log_query(username, log_date):
+    if isinstance(log_date, str):
+        log_date = date.fromisoformat(log_date)
+    current_week = week_start_for(date.today())
+    in_week = current_week <= log_date < current_week + timedelta(days=7)
+    # Assignments run left to right, so week_count still sees the old week_start.
+    return ("""
+        INSERT INTO user_log_stats (username, log_count, last_log_date, week_start, week_count)
+        VALUES (%s, 1, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            log_count = log_count + 1,
+            last_log_date = GREATEST(COALESCE(last_log_date, VALUES(last_log_date)), VALUES(last_log_date)),
+            week_count = IF(week_start = VALUES(week_start), week_count, 0) + VALUES(week_count),
+            week_start = VALUES(week_start)
+    """, (username, log_date, current_week, 1 if in_week else 0))
+
+def record_log(cursor, username, log_date):
+    cursor.execute(*record_log_query(username, log_date))
+
+def _reconcile_batch(cursor, usernames, current_week):
+    placeholders = ", ".join(["%s"] * len(usernames))
+    # Locking reads of just these users' daily_logs rows (via the username
+    # index): a log insert racing with it either commits before the SELECT
+    # reads it or waits and applies its increment on top of the corrected row.
+    cursor.execute(f"""
+        INSERT INTO user_log_stats (username, log_count, last_log_date, week_start, week_count)
+        SELECT username, COUNT(*), MAX(log_date), %s, SUM(log_date >= %s AND log_date < %s)
+        FROM daily_logs
+        WHERE username IN ({placeholders})
+        GROUP BY username
+        ON DUPLICATE KEY UPDATE
+            log_count = VALUES(log_count),
+            last_log_date = VALUES(last_log_date),
+            week_start = VALUES(week_start),
+            week_count = VALUES(week_count)
+    """, (current_week, current_week, current_week + timedelta(days=7), *usernames))
+    cursor.execute(f"""
+        DELETE FROM user_log_stats
+        WHERE username IN ({placeholders})
+          AND NOT EXISTS (SELECT 1 FROM daily_logs WHERE daily_logs.username = user_log_stats.username)
+    """, usernames)
+    return cursor.rowcount
+
+def reconcile(batch_size=200):
+    # Recomputes the counters a batch of users at a time, each batch in its own
+    # short transaction, so /log inserts only ever wait on the few users being
+    # recomputed at that moment. Safe to run while the app is live.
+    current_week = week_start_for(date.today())
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT DISTINCT username FROM daily_logs WHERE username IS NOT NULL
+            UNION
+            SELECT username FROM user_log_stats
+        """)
+        usernames = sorted(row[0] for row in cursor.fetchall())
+        conn.commit()
+
+        removed = 0
+        for i in range(0, len(usernames), batch_size):
+            try:
+                removed += _reconcile_batch(cursor, usernames[i:i + batch_size], current_week)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        cursor.close()
+        conn.close()
+    return len(usernames) - removed, removed
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Maintain the per-user log counters in user_log_stats.")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--batch-size", type=int, default=200, help="users recomputed per transaction")
+    args = parser.parse_args()
+
+    users, removed = reconcile(args.batch_size)
+    print(f"✅ Reconciled counters for {users} users, {removed} stale rows removed.")
@@ -1,26 +1,186 @@
-import mysql.connector
-from datetime import datetime
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 from dotenv import load_dotenv
 import os
+from encryption import fernet
+from batch_decrypt import decrypt_batch
+from search_index import entry_tokens
+from repository import repository
 
 # Load .env variables
 load_dotenv()
 
-def log_entry(entry_text):
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = conn.cursor()
-    sql = "INSERT INTO daily_logs (log_date, entry) VALUES (%s, %s)"
-    cursor.execute(sql, (datetime.today().date(), entry_text))
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("✅ Entry successfully logged to AWS RDS!")
+FIELDS = ["username", "log_date", "entry"]
+
+def log_entry(entry_text, username):
+    log_date = datetime.today().date()
+    encrypted_entry = fernet.encrypt(entry_text.encode()).decode()
+    # Indexed and counted in the same transaction as the insert
+    repository.add_log(username, log_date, encrypted_entry, entry_tokens(username, entry_text))
+    print("✅ Entry successfully logged!")
+
+def read_csv_records(handle):
+    reader = csv.DictReader(handle)
+    for record in reader:
+        yield reader.line_num, record
+
+def read_ndjson_records(handle):
+    for line_number, line in enumerate(handle, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, {}
+
+def _valid(record):
+    if not isinstance(record, dict) or not all(record.get(field) for field in FIELDS):
+        return None
+    try:
+        log_date = date.fromisoformat(str(record["log_date"])[:10])
+    except ValueError:
+        return None
+    return str(record["username"]).strip(), log_date, str(record["entry"])
+
+def _encrypt_rows(rows):
+    # Module level so it can be pickled into the process pool
+    return [(log_date, fernet.encrypt(entry.encode()).decode(), username) for username, log_date, entry in rows]
+
+def _insert_rows(rows, plaintext):
+    # One transaction per batch: logs, their search tokens and the per-user counters
+    repository.add_logs([
+        (username, log_date, encrypted, entry_tokens(username, entry))
+        for (log_date, encrypted, username), (_, _, entry) in zip(rows, plaintext)
+    ])
+
+def _batches(records, batch_size, skip, stats):
+    batch = []
+    for line_number, record in records:
+        stats["read"] += 1
+        if stats["read"] <= skip:
+            continue
+        row = _valid(record)
+        if row is None:
+            stats["invalid"] += 1
+            print(f"⚠️ Skipping line {line_number}: needs username, log_date (YYYY-MM-DD) and entry", file=sys.stderr)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch, stats["read"]
+            batch = []
+    if batch:
+        yield batch, stats["read"]
+
+def import_logs(path, fmt, batch_size=1000, workers=None, skip=0):
+    # Encryption runs in a process pool while the main process inserts; at most
+    # a few batches are in flight so memory stays flat for any file size.
+    workers = workers or os.cpu_count() or 1
+    stats = {"read": 0, "invalid": 0, "imported": 0, "committed_through": skip}
+    started = time.perf_counter()
+
+    def insert(future, batch, read_through):
+        # Batches are inserted in file order, so everything up to read_through is in
+        rows = future.result()
+        _insert_rows(rows, batch)
+        stats["imported"] += len(rows)
+        stats["committed_through"] = read_through
+        _progress(stats, started)
+
+    handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        records = read_csv_records(handle) if fmt == "csv" else read_ndjson_records(handle)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = []
+            for batch, read_through in _batches(records, batch_size, skip, stats):
+                in_flight.append((pool.submit(_encrypt_rows, batch), batch, read_through))
+                if len(in_flight) > workers * 2:
+                    insert(*in_flight.pop(0))
+            for future, batch, read_through in in_flight:
+                insert(future, batch, read_through)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+    print(f"✅ Imported {stats['imported']} logs ({stats['invalid']} invalid rows skipped).")
+    return stats
+
+def _progress(stats, started):
+    elapsed = time.perf_counter() - started
+    print(f"… {stats['imported']} imported ({stats['imported'] / elapsed if elapsed else 0:.0f} rows/s); "
+          f"if interrupted, resume with --skip {stats['committed_through']}", file=sys.stderr)
+
+def export_logs(output, fmt, username=None, since=None, until=None, batch_size=1000):
+    clauses, args = [], []
+    if username:
+        clauses.append("username = %s")
+        args.append(username)
+    if since:
+        clauses.append("log_date >= %s")
+        args.append(since)
+    if until:
+        clauses.append("log_date <= %s")
+        args.append(until)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    # Rows stream from the database as they are fetched instead of being
+    # loaded into memory up front.
+    stats = {"exported": 0, "failed": 0}
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(output)
+        writer.writerow(["id"] + FIELDS)
+    sql = f"SELECT id, username, log_date, entry FROM daily_logs {where} ORDER BY id"
+    for rows in repository.stream(sql, tuple(args), batch_size):
+        decrypted = decrypt_batch(fernet, [row[3] for row in rows])
+        failed = {index for index, _ in decrypted.errors}
+        for index, (row, entry) in enumerate(zip(rows, decrypted)):
+            if index in failed:
+                print(f"⚠️ Could not decrypt daily_logs id {row[0]}", file=sys.stderr)
+                continue
+            if writer:
+                writer.writerow([row[0], row[1], row[2].isoformat(), entry])
+            else:
+                output.write(json.dumps({"id": row[0], "username": row[1], "log_date": row[2].isoformat(), "entry": entry}) + "\n")
+        stats["exported"] += len(rows) - len(failed)
+        stats["failed"] += len(failed)
+    print(f"✅ Exported {stats['exported']} logs ({stats['failed']} could not be decrypted).", file=sys.stderr)
+    return stats
 
 if __name__ == "__main__":
-    entry = input("📝 What did you work on today?\n")
-    log_entry(entry)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Log work, or bulk import/export daily_logs.")
+    commands = parser.add_subparsers(dest="command")
+
+    import_parser = commands.add_parser("import", help="bulk import logs from a CSV or NDJSON file")
+    import_parser.add_argument("path", help="file to read, or - for stdin")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="rows per multi-row INSERT")
+    import_parser.add_argument("--workers", type=int, help="encryption processes (default: CPU count)")
+    import_parser.add_argument("--skip", type=int, default=0, help="skip the first N records, to resume an import")
+
+    export_parser = commands.add_parser("export", help="stream decrypted logs to CSV or NDJSON")
+    export_parser.add_argument("--output", default="-", help="file to write, or - for stdout")
+    export_parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    export_parser.add_argument("--user", help="only this username")
+    export_parser.add_argument("--since", type=date.fromisoformat, help="first log date (YYYY-MM-DD)")
+    export_parser.add_argument("--until", type=date.fromisoformat, help="last log date (YYYY-MM-DD)")
+    export_parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched and decrypted at a time")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+        import_logs(args.path, fmt, args.batch_size, args.workers, args.skip)
+    elif args.command == "export":
+        fmt = args.format or ("csv" if args.output.endswith(".csv") else "ndjson")
+        if args.output == "-":
+            export_logs(sys.stdout, fmt, args.user, args.since, args.until, args.batch_size)
+        else:
+            with open(args.output, "w", newline="", encoding="utf-8") as output:
+                export_logs(output, fmt, args.user, args.since, args.until, args.batch_size)
+    else:
+        username = input("Enter your username: ").strip()
+        entry = input("📝 What did you work on today?\n")
+        log_entry(entry, username)
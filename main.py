@@ -1,79 +1,152 @@
-from datetime import datetime, timedelta
-from fastapi import FastAPI, Request, Form, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from passlib.context import CryptContext
 from starlette.middleware.sessions import SessionMiddleware
-from weekly_summary import fetch_weekly_logs, summarize_logs, save_summary_to_db
-import mysql.connector
-from cryptography.fernet import Fernet
-import base64
+from weekly_summary import generate_weekly_summary
+from weekly_summary import current_week, plan_weekly_summary, stream_complete, store_weekly_summary, PARTIAL_NOTE
+import asyncio
+import hmac
+import json
 import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 import re  
 from dotenv import load_dotenv
 from admin import router as admin_router
-from utils import get_db_connection, is_logged_in
-from admin import router as admin_router
+from utils import clamp_page_size, LOG_PAGE_SIZE
+from async_routes import router as async_router
+from async_db import close_async_pool
+from decrypt_cache import decrypt_cache
+from batch_decrypt import decrypt_batch
+from hashing import hash_password, verify_password, HashingBusy, BUSY_ERROR
+from throttle import login_throttle, client_ip
+from write_buffer import log_write_buffer, LOG_WRITE_BUFFER
+import metrics
+from search_index import entry_tokens, search_logs, search_context, run_search_backfill_job
+from jobs import job_queue, PENDING, RUNNING, COMPLETE
+from encryption import fernet
+from rekey import run_key_rotation_job
+from repository import repository
+from user_cache import user_cache
+from page_cache import cached_page
+from starlette.concurrency import run_in_threadpool
 from itsdangerous import URLSafeTimedSerializer
 
 load_dotenv()
 
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY").encode()
-fernet = Fernet(ENCRYPTION_KEY)
 
 serializer = URLSafeTimedSerializer(os.getenv("SECRET_KEY"))
 
 
 
 app = FastAPI()
+
+# Registered before SessionMiddleware so it runs inside it and can read the session.
+@app.middleware("http")
+async def check_account_active(request: Request, call_next):
+    # A deactivated or deleted account is logged out on its next request.
+    # Served from user_cache, so this rarely costs a query.
+    username = request.session.get("username")
+    if username:
+        hit, user = user_cache.cached(username)
+        if not hit:
+            user = await run_in_threadpool(user_cache.get, username)
+        if not user or not user["is_active"]:
+            request.session.clear()
+    return await call_next(request)
+
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET"))
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = metrics.start_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # Label by route template (/jobs/{job_id}), not the raw path
+        route = request.scope.get("route")
+        metrics.http_requests.observe(elapsed, request.method, route.path if route else "unmatched", str(status))
+        metrics.log_if_slow(request.method, request.url.path, status, elapsed, timings)
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    # Scrapers send METRICS_TOKEN as a bearer token; admins can read it in the
+    # browser. Without a token configured only admin sessions get through.
+    token = os.getenv("METRICS_TOKEN")
+    authorized = bool(token) and hmac.compare_digest(
+        request.headers.get("authorization", "").encode(), f"Bearer {token}".encode()
+    )
+    if not authorized and not request.session.get("is_admin"):
+        return PlainTextResponse("Unauthorized", status_code=401)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# ASYNC_DB=true serves the hot routes from async handlers on the aiomysql pool.
+# Registered first so they take precedence over the sync handlers below.
+USE_ASYNC_DB = os.getenv("ASYNC_DB", "false").lower() == "true"
+if USE_ASYNC_DB:
+    app.include_router(async_router)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_async_pool()
 
 
 def get_user(username):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE username=%s", (username,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result
+    return user_cache.get(username)
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
+def home(request: Request, cursor: str = None, page_size: int = LOG_PAGE_SIZE):
     if "username" not in request.session:
         return templates.TemplateResponse("home.html", {"request": request})
 
     username = request.session["username"]
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT log_date, entry FROM daily_logs WHERE username = %s ORDER BY log_date DESC",
-        (username,)
-    )
-    logs_encrypted = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    page_size = clamp_page_size(page_size)
 
-    # Decrypt each log entry
-    logs = []
-    for log_date, encrypted_entry in logs_encrypted:
-        try:
-            decrypted_entry = fernet.decrypt(encrypted_entry.encode()).decode()
-        except Exception:
-            decrypted_entry = "[Error decrypting entry]"
-        logs.append((log_date, decrypted_entry))
+    def render():
+        logs_encrypted, next_cursor = repository.log_page(username, cursor, page_size)
+
+        # Decrypt each log entry
+        decrypted = decrypt_batch(
+            fernet, [row[2] for row in logs_encrypted],
+            row_ids=[row[0] for row in logs_encrypted], table="daily_logs", owner=username
+        )
+        logs = [(row[1], entry) for row, entry in zip(logs_encrypted, decrypted)]
+
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "logs": logs,
+            "next_cursor": next_cursor,
+            "page_size": page_size,
+            "is_first_page": cursor is None
+        })
 
-    return templates.TemplateResponse("index.html", {"request": request, "logs": logs})
+    # Unchanged since the browser's copy: 304 without touching daily_logs
+    stamp = repository.content_version(username)
+    if stamp is None:
+        return render()
+    return cached_page(request, stamp, ("home", username, cursor, page_size), render)
 @app.post("/login")
 def login(request: Request, username: str = Form(...), password: str = Form(...)):
-    user = get_user(username)
+    # Throttle before any lookup or bcrypt work so login storms stay cheap.
+    retry_after = login_throttle.hit(username, client_ip(request))
+    if retry_after:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": f"Too many login attempts. Please try again in {retry_after} seconds."
+        }, status_code=429, headers={"Retry-After": str(retry_after)})
+
+    # Fresh row, not the cache: the password check must see the current hash
+    user = repository.get_user(username)
     
     if not user:
         return templates.TemplateResponse("login.html", {
@@ -87,13 +160,22 @@ def login(request: Request, username: str = Form(...), password: str = Form(...)
             "error": "This account is inactive. Please contact an administrator."
         })
 
-    if not pwd_context.verify(password, user["password"]):
+    try:
+        password_ok = verify_password(password, user["password"])
+    except HashingBusy:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": BUSY_ERROR
+        }, status_code=503)
+
+    if not password_ok:
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": "Incorrect password."
         })
 
     # Success
+    login_throttle.reset(username)
     request.session["username"] = username
     return RedirectResponse("/", status_code=302)
 @app.get("/login", response_class=HTMLResponse)
@@ -101,18 +183,8 @@ def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 def create_user(username, hashed_password, first_name, last_name, email, phone_number):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO users (username, password, first_name, last_name, email, phone_number)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-        (username, hashed_password, first_name, last_name, email, phone_number)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    repository.create_user(username, hashed_password, first_name, last_name, email, phone_number)
+    user_cache.invalidate(username)
 @app.post("/signup")
 def signup(
     request: Request,
@@ -143,7 +215,13 @@ def signup(
         })
 
     # Hash password and create user
-    hashed_pw = pwd_context.hash(password)
+    try:
+        hashed_pw = hash_password(password)
+    except HashingBusy:
+        return templates.TemplateResponse("signup.html", {
+            "request": request,
+            "error": BUSY_ERROR
+        }, status_code=503)
     create_user(username, hashed_pw, first_name, last_name, email, phone_number)
     request.session["username"] = username
     return RedirectResponse("/", status_code=302)
@@ -157,33 +235,40 @@ def logout(request: Request):
     return RedirectResponse("/", status_code=302)
 
 @app.get("/summaries", response_class=HTMLResponse)
-def view_summaries(request: Request):
+def view_summaries(request: Request, job: str = None):
     if "username" not in request.session:
         return RedirectResponse("/login", status_code=302)
 
     username = request.session["username"]
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT week_start, week_end, summary FROM weekly_summaries WHERE username = %s ORDER BY week_start DESC",
-        (username,)
-    )
-    encrypted_summaries = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    current_job = job_queue.current_for(username, "weekly_summary", job)
 
-    summaries = []
-    for start, end, encrypted_summary in encrypted_summaries:
-        try:
-            decrypted_summary = fernet.decrypt(encrypted_summary.encode()).decode()
-        except Exception:
-            decrypted_summary = "[Error decrypting summary]"
-        summaries.append((start, end, decrypted_summary))
+    def render():
+        encrypted_summaries = repository.list_summaries(username)
 
-    return templates.TemplateResponse("summary.html", {
-        "request": request,
-        "summaries": summaries
-    })
+        decrypted = decrypt_batch(
+            fernet, [row[3] for row in encrypted_summaries],
+            row_ids=[row[0] for row in encrypted_summaries], table="weekly_summaries", owner=username,
+            placeholder="[Error decrypting summary]"
+        )
+        summaries = [(row[1], row[2], summary) for row, summary in zip(encrypted_summaries, decrypted)]
+
+        return templates.TemplateResponse("summary.html", {
+            "request": request,
+            "summaries": summaries,
+            "job": current_job
+        })
+
+    stamp = repository.content_version(username)
+    if stamp is None:
+        return render()
+    # The job banner changes without a summary write, so its state is part of
+    # the tag, and Last-Modified is left off while one is shown.
+    job_state = None
+    if current_job:
+        job_state = (current_job["id"], current_job["status"], json.dumps(current_job["result"], sort_keys=True, default=str))
+    return cached_page(
+        request, stamp, ("summaries", username, job_state), render, use_last_modified=current_job is None
+    )
 @app.post("/log")
 def add_log(request: Request, log_date: str = Form(...), entry: str = Form(...)):
     if "username" not in request.session:
@@ -195,34 +280,31 @@ def add_log(request: Request, log_date: str = Form(...), entry: str = Form(...))
     encrypted_entry = fernet.encrypt(entry.encode()).decode()
 
     # Save to DB
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO daily_logs (log_date, entry, username) VALUES (%s, %s, %s)",
-        (log_date, encrypted_entry, username)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    if LOG_WRITE_BUFFER and repository.name == "mysql":
+        # Blocks until the group commit holding this row is durable
+        log_write_buffer.write(log_date, encrypted_entry, username, entry)
+    else:
+        repository.add_log(username, log_date, encrypted_entry, entry_tokens(username, entry))
+    decrypt_cache.invalidate_owner(username)
 
     return RedirectResponse("/", status_code=302)
-@app.post("/submit-summary")
-def submit_summary(request: Request, week_start: str = Form(...), week_end: str = Form(...), summary: str = Form(...)):
+@app.get("/search", response_class=HTMLResponse)
+def search(request: Request, q: str = "", before: int = None):
     if "username" not in request.session:
         return RedirectResponse("/login", status_code=302)
 
     username = request.session["username"]
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    rows, next_before = search_logs(username, q, before) if q.strip() else ([], None)
+    return templates.TemplateResponse("search.html", search_context(request, username, q, rows, next_before, "/search"))
 
-    cursor.execute("""
-        INSERT INTO weekly_summaries (week_start, week_end, summary, username)
-        VALUES (%s, %s, %s, %s)
-    """, (week_start, week_end, summary, username))
+@app.post("/submit-summary")
+def submit_summary(request: Request, week_start: str = Form(...), week_end: str = Form(...), summary: str = Form(...)):
+    if "username" not in request.session:
+        return RedirectResponse("/login", status_code=302)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    username = request.session["username"]
+    # Replaces any summary already stored for that week
+    store_weekly_summary(username, week_start, week_end, summary)
 
     return RedirectResponse("/summaries", status_code=302)
 
@@ -234,45 +316,129 @@ def generate_summary(request: Request):
     if not username:
         return RedirectResponse("/login", status_code=302)
 
-    # Calculate current week's date range
-    start_of_week = datetime.today() - timedelta(days=datetime.today().weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-
-    # Fetch logs for the week
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT log_date, entry FROM daily_logs
-        WHERE log_date BETWEEN %s AND %s AND username = %s
-        ORDER BY log_date ASC
-    """, (start_of_week.date(), end_of_week.date(), username))
-    logs = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    if not logs:
-        return RedirectResponse("/", status_code=302)
-
-    # Decrypt logs and prepare text for summarization
-    log_text = "\n".join([
-        f"{log[0]}: {fernet.decrypt(log[1].encode()).decode(errors='ignore')}"
-        for log in logs
-    ])
-    summary_text = summarize_logs(log_text)
-
-    # Encrypt the summary and store it
-    encrypted_summary = fernet.encrypt(summary_text.encode()).decode()
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO weekly_summaries (week_start, week_end, summary, username)
-        VALUES (%s, %s, %s, %s)
-    """, (start_of_week.date(), end_of_week.date(), encrypted_summary, username))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # The model call can take tens of seconds, so it runs on the job queue.
+    # A second click while a job is in flight reuses that job.
+    job = job_queue.active_for(username, "weekly_summary")
+    job_id = job["id"] if job else job_queue.enqueue("weekly_summary", {"username": username}, owner=username)
 
-    return RedirectResponse("/summaries", status_code=302)
+    return RedirectResponse(f"/summaries?job={job_id}", status_code=302)
+
+@app.get("/jobs/{job_id}")
+def job_status(request: Request, job_id: str):
+    username = request.session.get("username")
+    job = job_queue.get(job_id)
+    if not username or not job or job["owner"] != username:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+
+    return JSONResponse({
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"]
+    })
+
+SUMMARY_STREAM_WORKERS = int(os.getenv("SUMMARY_STREAM_WORKERS", "8"))
+summary_stream_pool = ThreadPoolExecutor(max_workers=SUMMARY_STREAM_WORKERS, thread_name_prefix="summary-stream")
+
+async def _follow_summary_job(request, username):
+    # Events for a summary that is already being generated (by another
+    # request, process or the job queue): no tokens, just "done" or "error"
+    # once that job finishes.
+    job = await run_in_threadpool(job_queue.active_for, username, "weekly_summary")
+    while job and job["status"] in (PENDING, RUNNING):
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(1)
+        job = await run_in_threadpool(job_queue.current_for, username, "weekly_summary", job["id"])
+    if job and job["status"] == COMPLETE:
+        yield f"event: done\ndata: {json.dumps(job['result'], default=str)}\n\n"
+    else:
+        yield f"event: error\ndata: {json.dumps({'message': 'Summary generation failed. Please try again later.'})}\n\n"
+
+@app.get("/generate-summary/stream")
+async def stream_summary(request: Request):
+    username = request.session.get("username")
+    if not username:
+        return RedirectResponse("/login", status_code=302)
+
+    # The generation is recorded as a weekly_summary job, so a reload, a second
+    # tab or the /generate-summary form attaches to it instead of starting
+    # another model run.
+    job = await run_in_threadpool(job_queue.start_inline, "weekly_summary", {"username": username}, username)
+    if job is None:
+        return StreamingResponse(_follow_summary_job(request, username), media_type="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+        except RuntimeError:
+            pass  # event loop already gone; the summary is still saved below
+
+    def produce():
+        # Runs to completion even if the browser goes away, so a finished
+        # completion is never thrown away.
+        try:
+            start_date, end_date = current_week()
+            log_ids, stored, plan = plan_weekly_summary(username, start_date, end_date)
+            if not log_ids:
+                result = {"summary_id": None, "log_count": 0}
+            elif plan is None:
+                result = {"summary_id": stored[0], "log_count": len(log_ids)}
+            else:
+                parts = []
+                for piece in stream_complete(*plan):
+                    parts.append(piece)
+                    emit("token", {"text": piece})
+                if plan[0] == "partial":
+                    parts.append(PARTIAL_NOTE)
+                    emit("token", {"text": PARTIAL_NOTE})
+                summary_id = store_weekly_summary(username, start_date, end_date, "".join(parts), log_ids)
+                result = {"summary_id": summary_id, "log_count": len(log_ids)}
+        except Exception:
+            traceback.print_exc()
+            job_queue.finish_inline(job, error=traceback.format_exc(limit=5))
+            emit("error", {"message": "Summary generation failed. Please try again later."})
+            return
+        job_queue.finish_inline(job, result)
+        emit("done", result)
+
+    summary_stream_pool.submit(produce)
+
+    async def event_stream():
+        while True:
+            event, data = await events.get()
+            if await request.is_disconnected():
+                break
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event != "token":
+                break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def run_weekly_summary_job(payload):
+    return generate_weekly_summary(payload["username"])
+
+job_queue.register("weekly_summary", run_weekly_summary_job)
+job_queue.register("key_rotation", run_key_rotation_job)
+job_queue.register("search_backfill", run_search_backfill_job)
+
+@app.on_event("startup")
+def start_job_workers():
+    job_queue.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_queue.stop()
+    log_write_buffer.stop()
 
 @app.get("/forgot-password", response_class=HTMLResponse)
 def forgot_password_form(request: Request):
@@ -317,13 +483,16 @@ def process_reset(request: Request, token: str = Form(...), new_password: str =
             "token": token
         })
 
-    hashed = pwd_context.hash(new_password)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET password = %s WHERE username = %s", (hashed, username))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        hashed = hash_password(new_password)
+    except HashingBusy:
+        return templates.TemplateResponse("reset_password.html", {
+            "request": request,
+            "error": BUSY_ERROR,
+            "token": token
+        }, status_code=503)
+    repository.set_password(username, hashed)
+    user_cache.invalidate(username)
 
     return RedirectResponse("/login", status_code=302)
 # The Admin Router
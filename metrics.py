@@ -0,0 +1,222 @@
+import bisect
+import contextvars
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# In-process metrics in the Prometheus text format, plus a per-request
+# breakdown (database, decryption, bcrypt, model time) that the HTTP middleware
+# reads back to log slow requests. Work done on other threads is timed by the
+# calling thread, so it still lands on the request that waited for it.
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+http_requests = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+db_queries = Histogram("db_query_duration_seconds", "Database statement latency by fingerprint.", ("statement",))
+db_rows = Counter("db_rows_fetched_total", "Rows fetched by statement fingerprint.", ("statement",))
+decrypt_time = Histogram("decrypt_duration_seconds", "Time spent decrypting a batch of rows.", ())
+decrypt_rows = Counter("decrypt_rows_total", "Rows passed through batch decryption.", ())
+bcrypt_time = Histogram("bcrypt_duration_seconds", "Password hash/verify time including queueing.", ("operation",))
+model_time = Histogram("model_request_duration_seconds", "Chat completion latency by summary stage.", ("stage",))
+
+REGISTRY = [http_requests, db_queries, db_rows, decrypt_time, decrypt_rows, bcrypt_time, model_time]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# Per-request totals; None outside a request (jobs, CLIs).
+_request = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    timings = {"db": 0.0, "db_queries": 0, "db_rows": 0, "decrypt": 0.0, "bcrypt": 0.0, "model": 0.0}
+    _request.set(timings)
+    return timings
+
+
+def _add(key, amount):
+    timings = _request.get()
+    if timings is not None:
+        timings[key] += amount
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_VALUE_LISTS = re.compile(r"(VALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+", re.IGNORECASE)
+
+
+def fingerprint(sql):
+    # Same statement shape -> same fingerprint, whatever the values or list lengths.
+    sql = " ".join(sql.split())
+    sql = sql.replace("%s", "?")
+    sql = _LITERALS.sub("?", sql)
+    sql = _VALUE_LISTS.sub(r"\1", sql)
+    sql = _PLACEHOLDER_LISTS.sub("(?+)", sql)
+    return sql[:200]
+
+
+def record_query(sql, seconds, rows=0):
+    statement = fingerprint(sql)
+    db_queries.observe(seconds, statement)
+    if rows:
+        db_rows.inc(rows, statement)
+    _add("db", seconds)
+    _add("db_queries", 1)
+    _add("db_rows", rows)
+
+
+def record_decrypt(seconds, rows):
+    decrypt_time.observe(seconds)
+    decrypt_rows.inc(rows)
+    _add("decrypt", seconds)
+
+
+def record_bcrypt(operation, seconds):
+    bcrypt_time.observe(seconds, operation)
+    _add("bcrypt", seconds)
+
+
+def record_model(stage, seconds):
+    model_time.observe(seconds, stage)
+    _add("model", seconds)
+
+
+class TimedCursor:
+    # Wraps a DB-API cursor: execute time is recorded under the statement's
+    # fingerprint, and rows fetched afterwards are counted against it.
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, args=()):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, args)
+        finally:
+            self._statement = sql
+            record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_args):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_args)
+        finally:
+            self._statement = sql
+            record_query(sql, time.perf_counter() - started)
+
+    def _fetched(self, started, rows):
+        # Unbuffered cursors do their network reads here, so count the time too.
+        seconds = time.perf_counter() - started
+        statement = fingerprint(self._statement or "")
+        if rows:
+            db_rows.inc(rows, statement)
+        _add("db", seconds)
+        _add("db_rows", rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+def log_if_slow(method, path, status, seconds, timings):
+    if seconds * 1000 < SLOW_REQUEST_MS:
+        return
+    print(
+        f"🐢 SLOW {method} {path} {status} {seconds * 1000:.0f}ms: "
+        f"db {timings['db'] * 1000:.0f}ms ({timings['db_queries']} queries, {timings['db_rows']} rows), "
+        f"decrypt {timings['decrypt'] * 1000:.0f}ms, bcrypt {timings['bcrypt'] * 1000:.0f}ms, "
+        f"model {timings['model'] * 1000:.0f}ms",
+        flush=True
+    )
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from dotenv import load_dotenv
+from fastapi.responses import HTMLResponse, Response
+
+load_dotenv()
+
+# Conditional GET and rendered-HTML caching for the per-user log and summary
+# pages. Each user's pages are tagged with users.content_version, which every
+# log and summary write bumps in its own transaction (repository.py). An
+# unchanged page answers 304 after reading that one stamp, and a changed one is
+# rendered once per version and then served from memory.
+
+
+def _templates_digest(directory="templates"):
+    # Part of every ETag, so a deploy that changes the templates never gets a
+    # 304 for HTML the browser rendered from the old ones.
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as handle:
+                digest.update(name.encode() + b"\0" + handle.read())
+    return digest.hexdigest()[:12]
+
+
+TEMPLATES_DIGEST = _templates_digest()
+
+
+class PageCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # etag -> rendered body, oldest first. Old versions are never read
+        # again and simply age out.
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+            }
+
+
+page_cache = PageCache(max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))))
+
+
+def page_etag(stamp, *parts):
+    # parts: page name, the user whose data it shows and any query parameters
+    # that change the output. Hashed so usernames don't appear in headers.
+    material = "\0".join(str(part) for part in (TEMPLATES_DIGEST, *parts))
+    return f'W/"{stamp[0]}-{hashlib.sha256(material.encode()).hexdigest()[:24]}"'
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Wins over If-Modified-Since when both are sent. Weak comparison,
+        # since proxies may add or drop the W/ prefix.
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _lookup(request, stamp, parts, use_last_modified):
+    # (etag, headers, response): response is the 304 or cached page, or None
+    # when the page has to be rendered.
+    etag = page_etag(stamp, *parts)
+    last_modified = stamp[1].replace(tzinfo=timezone.utc) if stamp[1] and use_last_modified else None
+    # private: the pages are per user; no-cache: always revalidate with us
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if _not_modified(request, etag, last_modified):
+        page_cache.count_not_modified()
+        return etag, headers, Response(status_code=304, headers=headers)
+
+    body = page_cache.get(etag)
+    return etag, headers, HTMLResponse(body, headers=headers) if body is not None else None
+
+
+def _store(etag, headers, response):
+    if response.status_code != 200:
+        return response
+    page_cache.put(etag, response.body)
+    return HTMLResponse(response.body, headers=headers)
+
+
+def cached_page(request, stamp, parts, render, use_last_modified=True):
+    # stamp: (version, updated_at) from repository.content_version.
+    # render() builds the TemplateResponse and only runs on a cache miss.
+    etag, headers, response = _lookup(request, stamp, parts, use_last_modified)
+    if response is not None:
+        return response
+    return _store(etag, headers, render())
+
+
+async def cached_page_async(request, stamp, parts, render, use_last_modified=True):
+    # cached_page for the async routes; render is a coroutine function.
+    etag, headers, response = _lookup(request, stamp, parts, use_last_modified)
+    if response is not None:
+        return response
+    return _store(etag, headers, await render())
@@ -0,0 +1,162 @@
+import argparse
+import os
+import time
+
+from cryptography.fernet import InvalidToken
+from dotenv import load_dotenv
+from utils import get_db_connection
+from encryption import fernet, primary_fernet, PRIMARY_KEY_ID
+
+load_dotenv()
+
+# Re-encrypts stored ciphertext under the current primary key. Each table is
+# walked in id order a batch at a time; every batch commits together with its
+# progress row, so the job can stop at any point and pick up where it left off.
+# A new primary key (PRIMARY_KEY_ID) starts the walk over.
+
+# (table, encrypted column)
+ENCRYPTED_COLUMNS = [
+    ("daily_logs", "entry"),
+    ("weekly_summaries", "summary"),
+]
+
+BATCH_SIZE = int(os.getenv("KEY_ROTATION_BATCH_SIZE", "500"))
+# Seconds to sleep between batches so live traffic keeps the database
+PAUSE = float(os.getenv("KEY_ROTATION_PAUSE", "0.05"))
+
+
+def _load_progress(cursor, table):
+    cursor.execute(
+        "SELECT key_id, last_id, rotated, skipped, failed FROM key_rotation_progress WHERE table_name = %s",
+        (table,)
+    )
+    row = cursor.fetchone()
+    if row is None or row[0] != PRIMARY_KEY_ID:
+        return {"last_id": 0, "rotated": 0, "skipped": 0, "failed": 0}
+    return {"last_id": row[1], "rotated": row[2], "skipped": row[3], "failed": row[4]}
+
+
+def _save_progress(cursor, table, progress, finished=False):
+    cursor.execute("""
+        INSERT INTO key_rotation_progress (table_name, key_id, last_id, rotated, skipped, failed, updated_at, finished_at)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW(), IF(%s, NOW(), NULL))
+        ON DUPLICATE KEY UPDATE
+            key_id = VALUES(key_id),
+            last_id = VALUES(last_id),
+            rotated = VALUES(rotated),
+            skipped = VALUES(skipped),
+            failed = VALUES(failed),
+            updated_at = VALUES(updated_at),
+            finished_at = VALUES(finished_at)
+    """, (table, PRIMARY_KEY_ID, progress["last_id"], progress["rotated"], progress["skipped"],
+          progress["failed"], finished))
+
+
+def _rotate(ciphertext):
+    # Returns the new ciphertext, None if it is already under the primary key,
+    # or raises InvalidToken if no configured key can read it.
+    try:
+        primary_fernet.decrypt(ciphertext.encode())
+        return None
+    except InvalidToken:
+        return fernet.rotate(ciphertext.encode()).decode()
+
+
+def rotate_table(table, column, batch_size=BATCH_SIZE, pause=PAUSE, report=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    progress = _load_progress(cursor, table)
+    conn.rollback()
+
+    while True:
+        cursor.execute(
+            f"SELECT id, {column} FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+            (progress["last_id"], batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row_id, ciphertext in rows:
+            try:
+                rotated = _rotate(ciphertext)
+            except InvalidToken:
+                progress["failed"] += 1
+                continue
+            if rotated is None:
+                progress["skipped"] += 1
+            else:
+                updates.append((rotated, row_id, ciphertext))
+        # Only replaces rows nobody rewrote since they were read
+        cursor.executemany(f"UPDATE {table} SET {column} = %s WHERE id = %s AND {column} = %s", updates)
+        progress["rotated"] += len(updates)
+        progress["last_id"] = rows[-1][0]
+        _save_progress(cursor, table, progress)
+        conn.commit()
+
+        if report:
+            report(table, progress)
+        time.sleep(pause)
+
+    _save_progress(cursor, table, progress, finished=True)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return progress
+
+
+def rotate_all(batch_size=BATCH_SIZE, pause=PAUSE, report=None):
+    return {table: rotate_table(table, column, batch_size, pause, report) for table, column in ENCRYPTED_COLUMNS}
+
+
+def rotation_status():
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    status = {"primary_key_id": PRIMARY_KEY_ID, "tables": {}}
+    for table, _ in ENCRYPTED_COLUMNS:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) AS max_id FROM {table}")
+        max_id = cursor.fetchone()["max_id"]
+        cursor.execute("SELECT * FROM key_rotation_progress WHERE table_name = %s", (table,))
+        row = cursor.fetchone()
+        if row is None or row["key_id"] != PRIMARY_KEY_ID:
+            status["tables"][table] = {"max_id": max_id, "last_id": 0, "percent": 0.0, "finished": False}
+            continue
+        status["tables"][table] = {
+            "max_id": max_id,
+            "last_id": row["last_id"],
+            "rotated": row["rotated"],
+            "skipped": row["skipped"],
+            "failed": row["failed"],
+            "percent": round(100.0 * min(row["last_id"], max_id) / max_id, 1) if max_id else 100.0,
+            "updated_at": row["updated_at"].isoformat() if row["updated_at"] else None,
+            "finished": row["finished_at"] is not None,
+        }
+    cursor.close()
+    conn.close()
+    return status
+
+
+def run_key_rotation_job(payload):
+    return rotate_all(payload.get("batch_size", BATCH_SIZE), payload.get("pause", PAUSE))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt stored logs and summaries under the newest key.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--pause", type=float, default=PAUSE, help="seconds to sleep between batches")
+    parser.add_argument("--status", action="store_true", help="only show progress")
+    args = parser.parse_args()
+
+    if args.status:
+        for table, info in rotation_status()["tables"].items():
+            print(f"{table}: {info['percent']}% (id {info['last_id']} of {info['max_id']})"
+                  f"{' ✅ finished' if info['finished'] else ''}")
+    else:
+        def report(table, progress):
+            print(f"… {table}: through id {progress['last_id']}, {progress['rotated']} rotated, "
+                  f"{progress['skipped']} already current, {progress['failed']} unreadable")
+
+        for table, progress in rotate_all(args.batch_size, args.pause, report).items():
+            print(f"✅ {table}: {progress['rotated']} rotated, {progress['skipped']} already current, "
+                  f"{progress['failed']} unreadable")
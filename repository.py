@@ -0,0 +1,420 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+from dotenv import load_dotenv
+from db_pool import get_pool
+from log_stats import record_log_query
+from metrics import TimedCursor
+from utils import log_page_query, split_log_page, LOG_PAGE_SIZE
+import schema
+
+load_dotenv()
+
+# Data access for the core tables (users, daily_logs, weekly_summaries,
+# admin_logs) and the rows kept alongside them (user_log_stats,
+# log_search_index). STORAGE_BACKEND picks the implementation: "mysql" (the
+# default, on the shared pool in db_pool.py) or "sqlite", an embedded database
+# file for running the app and its benchmarks without a MySQL server.
+#
+# Both take %s placeholders, so portable SQL built elsewhere
+# (admin.dashboard_query, the audit log filters, search_index.search_logs) runs
+# on either through query()/stream(). Only the statements whose syntax differs
+# are overridden per backend.
+#
+# Still MySQL-only: ASYNC_DB routes, the log write buffer, rekey.py, the search
+# index backfill and log_stats.py reconcile.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "worklog.sqlite3")
+
+
+# What login reads from users; always fetched fresh, never cached.
+USER_COLUMNS = "username, password, is_active, is_admin"
+# What the per-request account check and the signup/reset lookups read. These
+# rows are cached (user_cache.py), so the password hash stays out of them.
+ACCOUNT_COLUMNS = "username, is_active, is_admin"
+
+
+def content_version_query(username):
+    # Bumps the stamp behind the user's page ETags (page_cache.py). Runs in the
+    # same transaction as the write it stands for, so a reader that sees the
+    # new version also sees the new rows.
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    return ("""
+        UPDATE users SET content_version = content_version + 1, content_updated_at = %s
+        WHERE username = %s
+    """, (now, username))
+
+
+def content_version_lookup(username):
+    return "SELECT content_version, content_updated_at FROM users WHERE username = %s", (username,)
+
+
+class MySQLRepository:
+    name = "mysql"
+
+    INSERT_IGNORE = "INSERT IGNORE"
+
+    # One summary per user and week: regenerating replaces the row in place, and
+    # LAST_INSERT_ID(id) makes lastrowid the existing row's id on update.
+    UPSERT_SUMMARY_SQL = """
+        INSERT INTO weekly_summaries (week_start, week_end, summary, username, log_ids)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            id = LAST_INSERT_ID(id),
+            week_end = VALUES(week_end),
+            summary = VALUES(summary),
+            log_ids = VALUES(log_ids)
+    """
+
+    # Single-row stamp bumped with every account change (users created, password
+    # or is_active changed), so each process's user_cache can notice changes
+    # made by the others.
+    BUMP_ACCOUNT_VERSION_SQL = """
+        INSERT INTO account_version (id, version) VALUES (1, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """
+
+    def connect(self):
+        return get_pool().connection()
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            self._begin(cursor)
+            yield cursor
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _begin(self, cursor):
+        pass  # autocommit is off, the first statement opens the transaction
+
+    # Generic access for SQL that is the same on every backend
+
+    def query(self, sql, args=(), dictionary=False):
+        conn = self.connect()
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(sql, args)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query_one(self, sql, args=(), dictionary=False):
+        rows = self.query(sql, args, dictionary)
+        return rows[0] if rows else None
+
+    def execute(self, sql, args=()):
+        with self.transaction() as cursor:
+            cursor.execute(sql, args)
+            return cursor.rowcount
+
+    def stream(self, sql, args=(), batch_size=1000):
+        # Yields lists of rows; the result is never held in memory all at once.
+        conn = self.connect()
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, args)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                # An abandoned export leaves rows unread and close() raises
+                # "Unread result found"; the connection must still go back to
+                # the pool, whose release() rolls it back or discards it.
+                pass
+            conn.close()
+
+    # users
+
+    def get_user(self, username):
+        return self.query_one(f"SELECT {USER_COLUMNS} FROM users WHERE username = %s", (username,), dictionary=True)
+
+    def get_account(self, username):
+        return self.query_one(f"SELECT {ACCOUNT_COLUMNS} FROM users WHERE username = %s", (username,), dictionary=True)
+
+    def account_version(self):
+        row = self.query_one("SELECT version FROM account_version WHERE id = 1")
+        return row[0] if row else 0
+
+    def _bump_account_version(self, cursor):
+        cursor.execute(self.BUMP_ACCOUNT_VERSION_SQL)
+
+    def create_user(self, username, hashed_password, first_name, last_name, email, phone_number, is_admin=False):
+        with self.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO users (username, password, first_name, last_name, email, phone_number, is_admin)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (username, hashed_password, first_name, last_name, email, phone_number, is_admin))
+            self._bump_account_version(cursor)
+
+    def create_users(self, rows):
+        # rows: [(username, hashed password, first, last, email, phone, is_admin)]; existing usernames are skipped
+        with self.transaction() as cursor:
+            cursor.executemany(f"""
+                {self.INSERT_IGNORE} INTO users (username, password, first_name, last_name, email, phone_number, is_admin)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+            self._bump_account_version(cursor)
+
+    def set_password(self, username, hashed_password):
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE users SET password = %s WHERE username = %s", (hashed_password, username))
+            self._bump_account_version(cursor)
+
+    def set_active(self, username, active, admin_username):
+        # The audit row commits with the change it records
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE users SET is_active = %s WHERE username = %s", (active, username))
+            cursor.execute(
+                "INSERT INTO admin_logs (admin_username, action, target_user) VALUES (%s, %s, %s)",
+                (admin_username, "reactivated user" if active else "deactivated user", username)
+            )
+            self._bump_account_version(cursor)
+
+    # daily_logs
+
+    def add_log(self, username, log_date, encrypted_entry, tokens=()):
+        # tokens: blind search tokens for the entry (search_index.entry_tokens).
+        # The index rows and the admin counters commit with the log itself.
+        with self.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO daily_logs (log_date, entry, username) VALUES (%s, %s, %s)",
+                (log_date, encrypted_entry, username)
+            )
+            log_id = cursor.lastrowid
+            self._index(cursor, [(username, token, log_id) for token in tokens])
+            cursor.execute(*self._log_stats_query(username, log_date))
+            self._bump_content_versions(cursor, [username])
+        return log_id
+
+    def add_logs(self, rows):
+        # rows: [(username, log_date, encrypted entry, tokens)], one transaction
+        if not rows:
+            return []
+        with self.transaction() as cursor:
+            ids = self._insert_logs(cursor, [(log_date, entry, username) for username, log_date, entry, _ in rows])
+            self._index(cursor, [
+                (username, token, log_id)
+                for log_id, (username, _, _, tokens) in zip(ids, rows)
+                for token in tokens
+            ])
+            stats = [self._log_stats_query(username, log_date) for username, log_date, _, _ in rows]
+            cursor.executemany(stats[0][0], [args for _, args in stats])
+            self._bump_content_versions(cursor, [username for username, _, _, _ in rows])
+        return ids
+
+    def _insert_logs(self, cursor, values):
+        # One INSERT per row: a multi-row INSERT's ids are not guaranteed to be
+        # consecutive (innodb_autoinc_lock_mode=2), and the search index rows
+        # need each log's real id. Still one transaction and one commit.
+        ids = []
+        for row in values:
+            cursor.execute("INSERT INTO daily_logs (log_date, entry, username) VALUES (%s, %s, %s)", row)
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def _index(self, cursor, values):
+        if values:
+            cursor.executemany(
+                f"{self.INSERT_IGNORE} INTO log_search_index (username, token, log_id) VALUES (%s, %s, %s)", values
+            )
+
+    def _log_stats_query(self, username, log_date):
+        return record_log_query(username, log_date)
+
+    def _bump_content_versions(self, cursor, usernames):
+        queries = [content_version_query(username) for username in sorted(set(usernames))]
+        cursor.executemany(queries[0][0], [args for _, args in queries])
+
+    def content_version(self, username):
+        # (version, updated_at) of everything the user's pages show, or None for an unknown user
+        return self.query_one(*content_version_lookup(username))
+
+    def log_page(self, username, cursor=None, page_size=LOG_PAGE_SIZE):
+        # ([(id, log_date, encrypted entry)], next cursor or None)
+        return split_log_page(self.query(*log_page_query(username, cursor, page_size)), page_size)
+
+    def week_logs(self, username, start_date, end_date):
+        return self.query("""
+            SELECT log_date, entry, id FROM daily_logs
+            WHERE log_date BETWEEN %s AND %s AND username = %s
+            ORDER BY log_date ASC, id ASC
+        """, (start_date, end_date, username))
+
+    # weekly_summaries
+
+    def list_summaries(self, username):
+        return self.query(
+            "SELECT id, week_start, week_end, summary FROM weekly_summaries WHERE username = %s ORDER BY week_start DESC",
+            (username,)
+        )
+
+    def get_summary(self, username, week_start):
+        # (id, encrypted summary, log_ids JSON or None), or None
+        return self.query_one(
+            "SELECT id, summary, log_ids FROM weekly_summaries WHERE username = %s AND week_start = %s",
+            (username, week_start)
+        )
+
+    def upsert_summary(self, args):
+        # args: (week_start, week_end, encrypted summary, username, log_ids JSON); returns the row id
+        with self.transaction() as cursor:
+            cursor.execute(self.UPSERT_SUMMARY_SQL, args)
+            summary_id = self._summary_id(cursor, args)
+            self._bump_content_versions(cursor, [args[3]])
+            return summary_id
+
+    def upsert_summaries(self, rows):
+        if not rows:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany(self.UPSERT_SUMMARY_SQL, rows)
+            self._bump_content_versions(cursor, [row[3] for row in rows])
+
+    def _summary_id(self, cursor, args):
+        return cursor.lastrowid
+
+
+# Dates go in as ISO text and come back as date/datetime for DATE and TIMESTAMP
+# columns, like they do from MySQL.
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()[:10]))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class _SQLiteCursor:
+    # Accepts %s placeholders and, like mysql.connector, returns dicts on request.
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, args=()):
+        return self._cursor.execute(sql.replace("%s", "?"), tuple(args))
+
+    def executemany(self, sql, seq_args):
+        return self._cursor.executemany(sql.replace("%s", "?"), seq_args)
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        names = [column[0] for column in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchmany(self, size=None):
+        return self._rows(self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+
+class _SQLiteConnection:
+    def __init__(self, path):
+        # check_same_thread is off because streamed responses are iterated from
+        # more than one threadpool thread; each connection is still used by one
+        # request at a time.
+        self._raw = sqlite3.connect(
+            path, timeout=30, isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return TimedCursor(_SQLiteCursor(self._raw.cursor(), dictionary))
+
+
+class SQLiteRepository(MySQLRepository):
+    name = "sqlite"
+
+    INSERT_IGNORE = "INSERT OR IGNORE"
+
+    BUMP_ACCOUNT_VERSION_SQL = """
+        INSERT INTO account_version (id, version) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE SET version = version + 1
+    """
+
+    UPSERT_SUMMARY_SQL = """
+        INSERT INTO weekly_summaries (week_start, week_end, summary, username, log_ids)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (username, week_start) DO UPDATE SET
+            week_end = excluded.week_end,
+            summary = excluded.summary,
+            log_ids = excluded.log_ids
+    """
+
+    # Same counters as log_stats.record_log_query; the SET expressions all see
+    # the old row, so week_count compares against the old week_start.
+    RECORD_LOG_SQL = """
+        INSERT INTO user_log_stats (username, log_count, last_log_date, week_start, week_count)
+        VALUES (%s, 1, %s, %s, %s)
+        ON CONFLICT (username) DO UPDATE SET
+            log_count = log_count + 1,
+            last_log_date = MAX(COALESCE(last_log_date, excluded.last_log_date), excluded.last_log_date),
+            week_count = CASE WHEN week_start = excluded.week_start THEN week_count ELSE 0 END + excluded.week_count,
+            week_start = excluded.week_start
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # WAL lets readers carry on while a write commits; it is a property of
+        # the database file, so setting it once is enough.
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        schema.ensure_sqlite_schema(conn)
+        conn.close()
+
+    def connect(self):
+        return _SQLiteConnection(self.path)
+
+    def _begin(self, cursor):
+        # Take the write lock up front instead of upgrading mid-transaction,
+        # which could fail with "database is locked" under concurrent writers.
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def _log_stats_query(self, username, log_date):
+        _, args = record_log_query(username, log_date)
+        return self.RECORD_LOG_SQL, args
+
+    def _summary_id(self, cursor, args):
+        cursor.execute(
+            "SELECT id FROM weekly_summaries WHERE username = %s AND week_start = %s", (args[3], args[0])
+        )
+        return cursor.fetchone()[0]
+
+
+def create_repository(backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteRepository(SQLITE_PATH)
+    if backend == "mysql":
+        return MySQLRepository()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+repository = create_repository()
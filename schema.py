@@ -0,0 +1,286 @@
+from dotenv import load_dotenv
+from utils import get_db_connection
+
+# Core tables, for a fresh database; existing ones are left alone and brought
+# up to date by COLUMNS and INDEXES below.
+CORE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        first_name VARCHAR(255) NULL,
+        last_name VARCHAR(255) NULL,
+        email VARCHAR(255) NULL,
+        phone_number VARCHAR(50) NULL,
+        is_active BOOLEAN NOT NULL DEFAULT TRUE,
+        is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+        content_version BIGINT NOT NULL DEFAULT 0,
+        content_updated_at DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        log_date DATE NOT NULL,
+        entry TEXT NOT NULL,
+        username VARCHAR(255) NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS weekly_summaries (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        week_start DATE NOT NULL,
+        week_end DATE NOT NULL,
+        summary MEDIUMTEXT NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        log_ids TEXT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        admin_username VARCHAR(255) NULL,
+        action VARCHAR(255) NOT NULL,
+        target_user VARCHAR(255) NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Derived tables owned by the application.
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS user_log_stats (
+        username VARCHAR(255) NOT NULL PRIMARY KEY,
+        log_count INT NOT NULL DEFAULT 0,
+        last_log_date DATE NULL,
+        week_start DATE NULL,
+        week_count INT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS key_rotation_progress (
+        table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+        key_id VARCHAR(64) NOT NULL,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        rotated BIGINT NOT NULL DEFAULT 0,
+        skipped BIGINT NOT NULL DEFAULT 0,
+        failed BIGINT NOT NULL DEFAULT 0,
+        updated_at DATETIME NULL,
+        finished_at DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS account_version (
+        id TINYINT NOT NULL PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS log_search_index (
+        username VARCHAR(255) NOT NULL,
+        token BINARY(16) NOT NULL,
+        log_id INT NOT NULL,
+        PRIMARY KEY (username, token, log_id)
+    )
+    """,
+]
+
+# Columns the application added to the core tables: (table, column, definition).
+COLUMNS = [
+    # daily_logs ids a generated summary covers, as a JSON list (weekly_summary.plan_weekly_summary)
+    ("weekly_summaries", "log_ids", "TEXT NULL"),
+    # Per-user stamp bumped with every log or summary write; drives page ETags (page_cache.py)
+    ("users", "content_version", "BIGINT NOT NULL DEFAULT 0"),
+    ("users", "content_updated_at", "DATETIME NULL"),
+]
+
+# Indexes the application queries rely on: (table, index name, columns).
+INDEXES = [
+    # Keyset pagination of a user's logs (utils.log_page_query)
+    ("daily_logs", "idx_daily_logs_user_date_id", "username, log_date, id"),
+    # Prefix search and sorting on the admin dashboard (admin.dashboard_query)
+    ("users", "idx_users_username", "username"),
+    ("users", "idx_users_email", "email"),
+    ("users", "idx_users_first_name", "first_name"),
+    ("users", "idx_users_last_name", "last_name"),
+    # Audit log keyset pagination, time-range export and its filters (admin.audit_logs)
+    ("admin_logs", "idx_admin_logs_time_id", "timestamp, id"),
+    ("admin_logs", "idx_admin_logs_admin_time_id", "admin_username, timestamp, id"),
+    ("admin_logs", "idx_admin_logs_target_time_id", "target_user, timestamp, id"),
+    ("admin_logs", "idx_admin_logs_action_time_id", "action, timestamp, id"),
+]
+
+# Unique keys the application upserts against. Existing duplicates are removed
+# (keeping the newest row) before the key is added.
+UNIQUE_INDEXES = [
+    # One summary per user and week (repository UPSERT_SUMMARY_SQL)
+    ("weekly_summaries", "uq_weekly_summaries_user_week", "username, week_start"),
+]
+
+# The whole schema for the embedded SQLite backend (repository.SQLiteRepository),
+# which has no older databases to migrate. INDEXES and UNIQUE_INDEXES apply
+# to both backends.
+SQLITE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        first_name TEXT,
+        last_name TEXT,
+        email TEXT,
+        phone_number TEXT,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        is_admin INTEGER NOT NULL DEFAULT 0,
+        content_version INTEGER NOT NULL DEFAULT 0,
+        content_updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        log_date DATE NOT NULL,
+        entry TEXT NOT NULL,
+        username TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS weekly_summaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        week_start DATE NOT NULL,
+        week_end DATE NOT NULL,
+        summary TEXT NOT NULL,
+        username TEXT NOT NULL,
+        log_ids TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_username TEXT,
+        action TEXT NOT NULL,
+        target_user TEXT,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_log_stats (
+        username TEXT NOT NULL PRIMARY KEY,
+        log_count INTEGER NOT NULL DEFAULT 0,
+        last_log_date DATE,
+        week_start DATE,
+        week_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS account_version (
+        id INTEGER NOT NULL PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS log_search_index (
+        username TEXT NOT NULL,
+        token BLOB NOT NULL,
+        log_id INTEGER NOT NULL,
+        PRIMARY KEY (username, token, log_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+def ensure_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for statement in CORE_TABLES + TABLES:
+        cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def ensure_columns():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for table, column, definition in COLUMNS:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        if cursor.fetchone()[0]:
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"Added column {table}.{column}")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def _existing_indexes(cursor, table, unique_only=False):
+    cursor.execute(f"""
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s {"AND non_unique = 0" if unique_only else ""}
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for index_name, column_name in cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column_name.lower())
+    return indexes
+
+def ensure_indexes():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for table, name, columns in INDEXES:
+        wanted = [column.strip().lower() for column in columns.split(",")]
+        existing = _existing_indexes(cursor, table)
+        # Skip when any index (including a primary or unique key) already leads with these columns.
+        if name in existing or any(cols[:len(wanted)] == wanted for cols in existing.values()):
+            continue
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+        print(f"Created index {name} on {table} ({columns})")
+    for table, name, columns in UNIQUE_INDEXES:
+        wanted = [column.strip().lower() for column in columns.split(",")]
+        existing = _existing_indexes(cursor, table, unique_only=True)
+        if name in existing or wanted in existing.values():
+            continue
+        match = " AND ".join(f"older.{column} = newer.{column}" for column in wanted)
+        cursor.execute(f"DELETE older FROM {table} older JOIN {table} newer ON {match} AND older.id < newer.id")
+        if cursor.rowcount:
+            print(f"Removed {cursor.rowcount} duplicate rows from {table} ({columns})")
+        cursor.execute(f"CREATE UNIQUE INDEX {name} ON {table} ({columns})")
+        print(f"Created unique index {name} on {table} ({columns})")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def _existing_sqlite_indexes(conn, table):
+    indexes = {}
+    for _, index_name, *_ in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        info = conn.execute(f"PRAGMA index_info({index_name})").fetchall()
+        indexes[index_name] = [row[2].lower() for row in sorted(info)]
+    return indexes
+
+def ensure_sqlite_schema(conn):
+    for statement in SQLITE_TABLES:
+        conn.execute(statement)
+    for table, column, definition in COLUMNS:
+        if column not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    for unique, specs in ((False, INDEXES), (True, UNIQUE_INDEXES)):
+        for table, name, columns in specs:
+            wanted = [column.strip().lower() for column in columns.split(",")]
+            existing = _existing_sqlite_indexes(conn, table)
+            # Same rule as ensure_indexes: skip when an index already leads with these columns
+            if name in existing or any(cols[:len(wanted)] == wanted for cols in existing.values()):
+                continue
+            conn.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})")
+
+if __name__ == "__main__":
+    load_dotenv()
+    from repository import repository
+    if repository.name == "sqlite":
+        # Opening the database already created or updated its schema
+        print(f"SQLite schema ready in {repository.path}")
+    else:
+        ensure_tables()
+        ensure_columns()
+        ensure_indexes()
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import hmac
+import os
+import re
+import time
+import unicodedata
+
+from dotenv import load_dotenv
+from utils import get_db_connection
+from encryption import fernet
+from batch_decrypt import decrypt_batch
+from repository import repository
+
+load_dotenv()
+
+# Blind keyword index over the encrypted daily_logs.entry column. Each distinct
+# word of an entry is stored as HMAC(key, username + word), so the database can
+# answer "which of this user's logs contain these words" with an indexed lookup
+# while never holding the words themselves. Mixing in the username keeps the
+# same word from producing the same token for two different users.
+#
+# SEARCH_INDEX_KEY is a secret of its own and deliberately not derived from
+# ENCRYPTION_KEYS: rotating the encryption keys must leave existing tokens
+# valid. Changing SEARCH_INDEX_KEY itself needs a --rebuild.
+
+SEARCH_INDEX_KEY = (os.getenv("SEARCH_INDEX_KEY") or "").encode()
+
+MIN_TOKEN_LENGTH = 2
+MAX_TOKENS_PER_ENTRY = int(os.getenv("SEARCH_MAX_TOKENS_PER_ENTRY", "500"))
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "50"))
+BACKFILL_BATCH_SIZE = int(os.getenv("SEARCH_BACKFILL_BATCH_SIZE", "500"))
+
+
+def tokenize(text):
+    normalized = unicodedata.normalize("NFKC", text).casefold()
+    tokens = []
+    seen = set()
+    for word in re.findall(r"\w+", normalized):
+        if len(word) >= MIN_TOKEN_LENGTH and word not in seen:
+            seen.add(word)
+            tokens.append(word)
+    return tokens[:MAX_TOKENS_PER_ENTRY]
+
+
+def blind_token(username, word):
+    # Checked here rather than at import so the app still starts without it
+    if not SEARCH_INDEX_KEY:
+        raise RuntimeError("SEARCH_INDEX_KEY is not set; generate one with: python -c \"import secrets; print(secrets.token_hex(32))\"")
+    return hmac.new(SEARCH_INDEX_KEY, f"{username}\0{word}".encode(), hashlib.sha256).digest()[:16]
+
+
+def entry_tokens(username, entry):
+    return [blind_token(username, word) for word in tokenize(entry)]
+
+
+def index_log_query(username, entry, log_id=None):
+    # (sql, args) adding the entry's tokens, or None when it has none. Without a
+    # log_id the row just inserted on the same connection is used.
+    tokens = entry_tokens(username, entry)
+    if not tokens:
+        return None
+    row_id = "%s" if log_id is not None else "LAST_INSERT_ID()"
+    placeholders = ", ".join([f"(%s, %s, {row_id})"] * len(tokens))
+    args = []
+    for token in tokens:
+        args += [username, token] + ([log_id] if log_id is not None else [])
+    return f"INSERT IGNORE INTO log_search_index (username, token, log_id) VALUES {placeholders}", tuple(args)
+
+
+def index_log(cursor, username, entry, log_id=None):
+    query = index_log_query(username, entry, log_id)
+    if query:
+        cursor.execute(*query)
+
+
+def index_logs(cursor, rows):
+    # rows: [(log_id, username, plaintext entry)]; executemany sends one multi-row INSERT
+    values = [
+        (username, blind_token(username, word), log_id)
+        for log_id, username, entry in rows
+        for word in tokenize(entry)
+    ]
+    if values:
+        cursor.executemany("INSERT IGNORE INTO log_search_index (username, token, log_id) VALUES (%s, %s, %s)", values)
+
+
+def search_logs(username, query, before=None, limit=SEARCH_LIMIT):
+    # Returns ([(id, log_date, encrypted entry)], next "before" id or None) for
+    # logs containing every word of the query, newest first.
+    words = tokenize(query)
+    if not words:
+        return [], None
+    tokens = [blind_token(username, word) for word in words]
+    placeholders = ", ".join(["%s"] * len(tokens))
+    clauses = ["i.username = %s", f"i.token IN ({placeholders})"]
+    args = [username, *tokens]
+    if before:
+        clauses.append("i.log_id < %s")
+        args.append(before)
+
+    rows = repository.query(f"""
+        SELECT d.id, d.log_date, d.entry
+        FROM (
+            SELECT i.log_id FROM log_search_index i
+            WHERE {' AND '.join(clauses)}
+            GROUP BY i.log_id
+            HAVING COUNT(*) = %s
+            ORDER BY i.log_id DESC
+            LIMIT %s
+        ) AS matches
+        JOIN daily_logs d ON d.id = matches.log_id AND d.username = %s
+        ORDER BY d.id DESC
+    """, (*args, len(tokens), limit + 1, username))
+
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+def search_context(request, username, q, rows, next_before, action):
+    decrypted = decrypt_batch(
+        fernet, [row[2] for row in rows],
+        row_ids=[row[0] for row in rows], table="daily_logs", owner=username,
+        placeholder="[Error decrypting log]"
+    )
+    return {
+        "request": request,
+        "username": username,
+        "q": q,
+        "results": [{"log_date": row[1], "entry": entry} for row, entry in zip(rows, decrypted)],
+        "next_before": next_before,
+        "action": action,
+    }
+
+
+def backfill(start_id=0, batch_size=BACKFILL_BATCH_SIZE, rebuild=False, report=None):
+    # Walks daily_logs in id order; INSERT IGNORE makes reruns and overlap with
+    # live writes harmless.
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if rebuild:
+        cursor.execute("DELETE FROM log_search_index")
+        conn.commit()
+
+    last_id, indexed, failed = start_id, 0, 0
+    while True:
+        cursor.execute(
+            "SELECT id, username, entry FROM daily_logs WHERE id > %s AND username IS NOT NULL ORDER BY id LIMIT %s",
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        decrypted = decrypt_batch(fernet, [row[2] for row in rows])
+        failed_indexes = {index for index, _ in decrypted.errors}
+        index_logs(cursor, [
+            (row[0], row[1], entry)
+            for index, (row, entry) in enumerate(zip(rows, decrypted))
+            if index not in failed_indexes
+        ])
+        conn.commit()
+        last_id = rows[-1][0]
+        indexed += len(rows) - len(failed_indexes)
+        failed += len(failed_indexes)
+        if report:
+            report(last_id, indexed, failed)
+    cursor.close()
+    conn.close()
+    return {"last_id": last_id, "indexed": indexed, "failed": failed}
+
+
+def run_search_backfill_job(payload):
+    return backfill(rebuild=payload.get("rebuild", False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the blind keyword index for log search.")
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this daily_logs id")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="drop the index first (e.g. after changing SEARCH_INDEX_KEY)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def report(last_id, indexed, failed):
+        print(f"… through id {last_id}: {indexed} indexed, {failed} unreadable "
+              f"({indexed / (time.perf_counter() - started):.0f} logs/s)")
+
+    result = backfill(args.start_id, args.batch_size, args.rebuild, report)
+    print(f"✅ Indexed {result['indexed']} logs ({result['failed']} unreadable).")
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from jobs import COMPLETE, FAILED, PENDING, RUNNING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), concurrency=1, max_attempts=2, backoff=0,
+                     poll_interval=0.05, lease=0.6)
+    yield queue
+    queue.stop()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def expire(queue, job_id):
+    # What a crashed worker leaves behind: a RUNNING row nobody heartbeats
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - queue.lease * 2, job_id))
+    conn.close()
+
+
+def test_job_runs_to_completion(queue):
+    queue.register("double", lambda payload: payload["n"] * 2)
+    job_id = queue.enqueue("double", {"n": 21}, owner="alice")
+    queue.start()
+
+    assert wait_for(lambda: queue.get(job_id)["status"] == COMPLETE)
+    assert queue.get(job_id)["result"] == 42
+    assert queue.active_for("alice", "double") is None
+
+
+def test_failed_job_is_retried_then_fails(queue):
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        raise ValueError("boom")
+
+    queue.register("flaky", flaky)
+    job_id = queue.enqueue("flaky", {})
+    queue._run(queue._claim())
+    assert queue.get(job_id)["status"] == PENDING
+    queue._run(queue._claim())
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert "boom" in job["error"]
+    assert len(calls) == 2
+
+
+def test_job_of_a_dead_worker_is_reclaimed_and_rerun(queue):
+    queue.register("echo", lambda payload: payload)
+    job_id = queue.enqueue("echo", {"x": 1}, owner="alice")
+    queue._claim()
+    expire(queue, job_id)
+
+    # Not in flight any more, so a new request may start one
+    assert queue.active_for("alice", "echo") is None
+    queue._reclaim()
+    assert queue.get(job_id)["status"] == PENDING
+
+    queue._run(queue._claim())
+    job = queue.get(job_id)
+    assert job["status"] == COMPLETE
+    assert job["attempts"] == 2
+
+
+def test_reclaim_fails_a_job_out_of_attempts(queue):
+    job_id = queue.enqueue("echo", {})
+    for _ in range(queue.max_attempts):
+        queue._claim()
+        expire(queue, job_id)
+        queue._reclaim()
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "Worker lease expired"
+
+
+def test_heartbeat_keeps_a_long_job_leased(queue):
+    calls = []
+
+    def slow(payload):
+        calls.append(payload)
+        time.sleep(queue.lease * 3)
+        return "done"
+
+    queue.register("slow", slow)
+    job_id = queue.enqueue("slow", {}, owner="alice")
+    queue.start()
+    assert wait_for(lambda: queue.get(job_id)["status"] == RUNNING)
+
+    time.sleep(queue.lease * 1.5)
+    assert queue.active_for("alice", "slow")["id"] == job_id
+    queue._reclaim()
+    assert queue.get(job_id)["status"] == RUNNING
+
+    assert wait_for(lambda: queue.get(job_id)["status"] == COMPLETE)
+    assert len(calls) == 1
+    assert queue.get(job_id)["attempts"] == 1
+
+
+def test_stale_attempt_cannot_finish_a_reclaimed_job(queue):
+    job_id = queue.enqueue("echo", {})
+    stale = queue._claim()
+    expire(queue, job_id)
+    queue._reclaim()
+    current = queue._claim()
+
+    queue._finish(stale, COMPLETE, result="stale")
+    assert queue.get(job_id)["status"] == RUNNING
+    queue._finish(current, COMPLETE, result="current")
+    assert queue.get(job_id)["result"] == "current"
+
+
+def test_inline_job_blocks_a_second_start_until_finished(queue):
+    job = queue.start_inline("summary", {}, "alice")
+    assert job["status"] == RUNNING
+    assert queue.start_inline("summary", {}, "alice") is None
+    assert queue.start_inline("summary", {}, "bob") is not None
+
+    time.sleep(queue.lease * 1.5)
+    assert queue.active_for("alice", "summary")["id"] == job["id"]
+
+    queue.finish_inline(job, result="text")
+    assert queue.get(job["id"])["result"] == "text"
+    assert queue.start_inline("summary", {}, "alice") is not None
+
+
+def test_only_one_of_many_concurrent_inline_starts_wins(queue):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(queue.start_inline("summary", {}, "alice")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([job for job in results if job is not None]) == 1
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from fastapi.responses import HTMLResponse
+
+from page_cache import cached_page, page_cache, page_etag
+
+
+class Request:
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+STAMP = (7, datetime(2026, 10, 18, 9, 30))
+
+
+def renderer(body="<p>logs</p>"):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return HTMLResponse(body)
+
+    return render, calls
+
+
+def test_page_is_rendered_once_per_version():
+    render, calls = renderer()
+    parts = ("logs", "etag-alice")
+
+    first = cached_page(Request(), STAMP, parts, render)
+    second = cached_page(Request(), STAMP, parts, render)
+
+    assert first.status_code == second.status_code == 200
+    assert first.body == second.body == b"<p>logs</p>"
+    assert first.headers["etag"] == second.headers["etag"] == page_etag(STAMP, *parts)
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert len(calls) == 1
+
+    cached_page(Request(), (8, STAMP[1]), parts, render)
+    assert len(calls) == 2
+
+
+def test_matching_etag_answers_304_without_rendering():
+    render, calls = renderer()
+    etag = page_etag(STAMP, "logs", "etag-bob")
+    before = page_cache.stats()["not_modified"]
+
+    response = cached_page(Request(if_none_match=etag), STAMP, ("logs", "etag-bob"), render)
+    # Weak comparison: a proxy may have dropped the W/ prefix
+    stripped = cached_page(Request(if_none_match=f'"x", {etag[2:]}'), STAMP, ("logs", "etag-bob"), render)
+
+    assert response.status_code == stripped.status_code == 304
+    assert response.headers["etag"] == etag
+    assert calls == []
+    assert page_cache.stats()["not_modified"] == before + 2
+
+
+def test_etag_differs_per_user_version_and_query():
+    assert page_etag(STAMP, "logs", "alice") != page_etag(STAMP, "logs", "bob")
+    assert page_etag(STAMP, "logs", "alice") != page_etag((8, STAMP[1]), "logs", "alice")
+    assert page_etag(STAMP, "logs", "alice", "cursor-1") != page_etag(STAMP, "logs", "alice", "cursor-2")
+    assert "alice" not in page_etag(STAMP, "logs", "alice")
+
+
+def test_if_modified_since_is_ignored_when_an_etag_is_sent():
+    render, calls = renderer()
+    parts = ("logs", "etag-carol")
+
+    stale_tag = cached_page(Request(if_none_match='W/"6-old"', if_modified_since="Sun, 18 Oct 2026 10:00:00 GMT"),
+                            STAMP, parts, render)
+    fresh_date = cached_page(Request(if_modified_since="Sun, 18 Oct 2026 10:00:00 GMT"), STAMP, parts, render)
+    old_date = cached_page(Request(if_modified_since="Sun, 18 Oct 2026 09:00:00 GMT"), STAMP, parts, render)
+
+    assert stale_tag.status_code == 200
+    assert fresh_date.status_code == 304
+    assert old_date.status_code == 200
+    assert len(calls) == 1
@@ -0,0 +1,76 @@
+from cryptography.fernet import Fernet, MultiFernet
+import pytest
+
+import rekey
+
+
+class Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+        self.updates = []
+
+    def execute(self, sql, args=()):
+        self.result = []
+        if sql.startswith("SELECT id"):
+            last_id, batch_size = args
+            self.result = [row for row in self.rows if row[0] > last_id][:batch_size]
+
+    def executemany(self, sql, rows):
+        self.updates.extend(rows)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    old, new = Fernet(Fernet.generate_key()), Fernet(Fernet.generate_key())
+    monkeypatch.setattr(rekey, "primary_fernet", new)
+    monkeypatch.setattr(rekey, "fernet", MultiFernet([new, old]))
+    return old, new
+
+
+def test_rotation_rewrites_only_rows_under_old_keys(keys, monkeypatch):
+    old, new = keys
+    stranger = Fernet(Fernet.generate_key())
+    rows = [
+        (1, old.encrypt(b"one").decode()),
+        (2, new.encrypt(b"two").decode()),
+        (3, stranger.encrypt(b"three").decode()),
+        (4, old.encrypt(b"four").decode()),
+    ]
+    cursor = Cursor(rows)
+    monkeypatch.setattr(rekey, "get_db_connection", lambda: Connection(cursor))
+
+    progress = rekey.rotate_table("daily_logs", "entry", batch_size=3, pause=0)
+
+    assert progress == {"last_id": 4, "rotated": 2, "skipped": 1, "failed": 1}
+    assert [(row_id, new.decrypt(ciphertext.encode())) for ciphertext, row_id, _ in cursor.updates] == [
+        (1, b"one"), (4, b"four")
+    ]
+    # Each update only applies if the row still holds what was read
+    assert [previous for _, _, previous in cursor.updates] == [rows[0][1], rows[3][1]]
@@ -0,0 +1,115 @@
+from datetime import date
+
+import pytest
+
+from repository import MySQLRepository, SQLiteRepository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return SQLiteRepository(str(tmp_path / "worklog.sqlite3"))
+
+
+def test_user_round_trip(repo):
+    repo.create_user("alice", "hash-1", "Alice", "A", "alice@example.com", "123")
+
+    user = repo.get_user("alice")
+    assert user["password"] == "hash-1"
+    assert user["is_active"]
+    # The cached account row never carries the password hash
+    assert "password" not in repo.get_account("alice")
+    assert repo.get_user("nobody") is None
+
+
+def test_account_changes_bump_the_shared_version(repo):
+    start = repo.account_version()
+    repo.create_user("alice", "hash-1", "Alice", "A", "alice@example.com", "123")
+    repo.set_password("alice", "hash-2")
+    repo.set_active("alice", False, "root")
+
+    assert repo.account_version() == start + 3
+    assert repo.get_user("alice")["password"] == "hash-2"
+    assert not repo.get_account("alice")["is_active"]
+
+
+def test_add_logs_indexes_each_row_under_its_own_id(repo):
+    repo.create_user("alice", "hash", "Alice", "A", "alice@example.com", "123")
+    ids = repo.add_logs([
+        ("alice", date(2026, 10, 12), "entry-a", [b"token-a".ljust(16, b"\0")]),
+        ("alice", date(2026, 10, 13), "entry-b", [b"token-b".ljust(16, b"\0")]),
+    ])
+
+    rows = repo.query("""
+        SELECT i.token, d.entry FROM log_search_index i JOIN daily_logs d ON d.id = i.log_id
+        ORDER BY d.id
+    """)
+    assert [(bytes(token).rstrip(b"\0"), entry) for token, entry in rows] == [
+        (b"token-a", "entry-a"), (b"token-b", "entry-b")
+    ]
+    assert [row[0] for row in repo.query("SELECT id FROM daily_logs ORDER BY id")] == ids
+    assert repo.query_one("SELECT log_count FROM user_log_stats WHERE username = %s", ("alice",))[0] == 2
+
+
+def test_keyset_pages_cover_every_log_once_in_order(repo):
+    repo.create_user("alice", "hash", "Alice", "A", "alice@example.com", "123")
+    # Several logs share a date, so the id tiebreak matters
+    days = [date(2026, 10, day) for day in (12, 12, 13, 13, 13, 14, 15)]
+    repo.add_logs([("alice", day, f"entry-{index}", []) for index, day in enumerate(days)])
+    repo.add_log("bob", date(2026, 10, 14), "not alice's")
+
+    expected = [row[0] for row in repo.query(
+        "SELECT id FROM daily_logs WHERE username = %s ORDER BY log_date DESC, id DESC", ("alice",)
+    )]
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = repo.log_page("alice", cursor, page_size=3)
+        seen.extend(row[0] for row in rows)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 3
+
+
+def test_summary_upsert_replaces_in_place_and_bumps_content_version(repo):
+    repo.create_user("alice", "hash", "Alice", "A", "alice@example.com", "123")
+    before = repo.content_version("alice")[0]
+
+    first = repo.upsert_summary((date(2026, 10, 12), date(2026, 10, 18), "v1", "alice", "[1]"))
+    second = repo.upsert_summary((date(2026, 10, 12), date(2026, 10, 18), "v2", "alice", "[1, 2]"))
+
+    assert first == second
+    assert repo.get_summary("alice", date(2026, 10, 12)) == (first, "v2", "[1, 2]")
+    assert repo.content_version("alice")[0] == before + 2
+    assert repo.content_version("nobody") is None
+
+
+def test_abandoned_stream_still_returns_its_connection():
+    # An unbuffered MySQL cursor with unread rows raises on close()
+    class Cursor:
+        def execute(self, sql, args):
+            pass
+
+        def fetchmany(self, size):
+            return [(1,), (2,)]
+
+        def close(self):
+            raise RuntimeError("Unread result found")
+
+    class Connection:
+        closed = False
+
+        def cursor(self, **kwargs):
+            return Cursor()
+
+        def close(self):
+            Connection.closed = True
+
+    repo = MySQLRepository()
+    repo.connect = Connection
+    stream = repo.stream("SELECT id FROM daily_logs")
+    next(stream)
+    stream.close()
+
+    assert Connection.closed
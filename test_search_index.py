@@ -0,0 +1,58 @@
+from datetime import date
+
+import pytest
+
+import search_index
+from encryption import fernet
+from repository import repository
+from search_index import blind_token, entry_tokens, search_logs, tokenize
+
+
+def add(username, day, text):
+    return repository.add_log(username, date(2026, 10, day), fernet.encrypt(text.encode()).decode(),
+                              entry_tokens(username, text))
+
+
+def test_tokenize_normalizes_and_dedupes():
+    assert tokenize("Fixed the LOGIN bug; fixed ＬＯＧＩＮ tests, a b") == ["fixed", "the", "login", "bug", "tests"]
+
+
+def test_tokens_differ_per_user_and_hide_the_word():
+    token = blind_token("alice", "deploy")
+
+    assert token == blind_token("alice", "deploy")
+    assert token != blind_token("bob", "deploy")
+    assert b"deploy" not in token
+    assert len(token) == 16
+
+
+def test_blind_token_needs_the_key(monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_KEY", b"")
+
+    with pytest.raises(RuntimeError):
+        blind_token("alice", "deploy")
+
+
+def test_search_matches_every_word_within_the_user():
+    first = add("search-alice", 12, "Deployed the billing service")
+    add("search-alice", 13, "Reviewed billing tests")
+    third = add("search-alice", 14, "Billing deploy follow-up: deployed hotfix")
+    add("search-bob", 14, "Deployed billing too")
+
+    rows, next_before = search_logs("search-alice", "billing DEPLOYED")
+
+    assert [row[0] for row in rows] == [third, first]
+    assert fernet.decrypt(rows[0][2].encode()).decode().startswith("Billing deploy")
+    assert next_before is None
+
+
+def test_search_pages_with_before():
+    ids = [add("search-carol", 12 + index, f"standup notes {index}") for index in range(5)]
+
+    rows, next_before = search_logs("search-carol", "standup", limit=2)
+    assert [row[0] for row in rows] == ids[:-3:-1]
+    rows, next_before = search_logs("search-carol", "standup", before=next_before, limit=2)
+    assert [row[0] for row in rows] == ids[-3:-5:-1]
+    rows, next_before = search_logs("search-carol", "standup", before=next_before, limit=2)
+    assert [row[0] for row in rows] == ids[:1]
+    assert next_before is None
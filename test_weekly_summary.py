@@ -0,0 +1,113 @@
+import pytest
+import tiktoken
+
+import weekly_summary
+
+
+@pytest.fixture
+def estimated_tokens(monkeypatch):
+    # Count with the offline ~4 characters per token estimate
+    monkeypatch.setattr(weekly_summary, "_encoding", None)
+    monkeypatch.setattr(weekly_summary, "_encoding_loaded", True)
+
+
+def week(days, words_per_entry):
+    return "\n".join(f"2026-10-{12 + day}: " + "word " * words_per_entry for day in range(days))
+
+
+def test_count_tokens_works_offline(monkeypatch):
+    def offline(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    monkeypatch.setattr(weekly_summary, "_encoding", None)
+    monkeypatch.setattr(weekly_summary, "_encoding_loaded", False)
+
+    assert weekly_summary.count_tokens("a" * 10) == 3
+    assert weekly_summary.split_logs("2026-10-12: " + "a" * 100, 10) == [
+        ("2026-10-12: " + "a" * 100)[i:i + 40] for i in range(0, 112, 40)
+    ]
+
+
+def test_count_tokens_falls_back_for_an_unknown_model(monkeypatch):
+    def unknown(model):
+        raise KeyError(model)
+
+    encoding = object()
+    monkeypatch.setattr(tiktoken, "encoding_for_model", unknown)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    monkeypatch.setattr(weekly_summary, "_encoding", None)
+    monkeypatch.setattr(weekly_summary, "_encoding_loaded", False)
+
+    assert weekly_summary._get_encoding() is encoding
+
+
+def test_split_logs_keeps_entries_whole_within_the_budget(estimated_tokens):
+    text = week(5, 20)
+    chunks = weekly_summary.split_logs(text, 60)
+
+    assert len(chunks) > 1
+    assert "\n".join(chunks) == text
+    for chunk in chunks:
+        assert weekly_summary.count_tokens(chunk) <= 60
+        assert all(line.startswith("2026-10-") for line in chunk.split("\n"))
+
+
+def test_split_logs_cuts_only_an_oversized_entry(estimated_tokens):
+    small = "2026-10-12: short"
+    big = "2026-10-13: " + "x" * 400
+    chunks = weekly_summary.split_logs(small + "\n" + big, 30)
+
+    assert chunks[0] == small
+    assert "".join(chunks[1:]) == big
+    assert all(weekly_summary.count_tokens(chunk) <= 30 for chunk in chunks)
+
+
+def test_final_stage_sends_a_small_week_in_one_call(estimated_tokens, monkeypatch):
+    monkeypatch.setattr(weekly_summary, "_complete", pytest.fail)
+    text = week(2, 5)
+
+    assert weekly_summary._final_stage(text) == ("summary", weekly_summary.SUMMARY_PROMPT, text)
+
+
+def test_final_stage_maps_chunks_then_reduces(estimated_tokens, monkeypatch):
+    chunks = []
+
+    def complete(stage, instructions, text):
+        chunks.append(text)
+        return f"- notes for {len(text)} chars"
+
+    monkeypatch.setattr(weekly_summary, "_complete", complete)
+    monkeypatch.setattr(weekly_summary, "SINGLE_CALL_TOKENS", 100)
+    monkeypatch.setattr(weekly_summary, "CHUNK_TOKENS", 60)
+    text = week(7, 30)
+
+    stage, instructions, notes = weekly_summary._final_stage(text)
+
+    assert (stage, instructions) == ("reduce", weekly_summary.REDUCE_PROMPT)
+    assert len(chunks) > 1
+    assert "\n".join(sorted(chunks)) == "\n".join(sorted(weekly_summary.split_logs(text, 60)))
+    assert notes.count("- notes for") == len(chunks)
+
+
+def test_final_stage_marks_notes_that_stop_shrinking_as_partial(estimated_tokens, monkeypatch):
+    calls = []
+
+    def complete(stage, instructions, text):
+        calls.append(text)
+        return text + " and more"
+
+    monkeypatch.setattr(weekly_summary, "_complete", complete)
+    monkeypatch.setattr(weekly_summary, "SINGLE_CALL_TOKENS", 100)
+    monkeypatch.setattr(weekly_summary, "CHUNK_TOKENS", 60)
+    monkeypatch.setattr(weekly_summary, "SUMMARY_MAX_ROUNDS", 3)
+
+    stage, instructions, notes = weekly_summary._final_stage(week(7, 30))
+
+    assert stage == "partial"
+    assert weekly_summary.count_tokens(notes) <= 100
+    # One round only: the notes grew, so further rounds are not attempted
+    assert len(calls) == len(weekly_summary.split_logs(week(7, 30), 60))
+    assert weekly_summary.with_partial_note(stage, "summary").endswith(weekly_summary.PARTIAL_NOTE)
+    assert weekly_summary.with_partial_note("reduce", "summary") == "summary"
@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import write_buffer
+from write_buffer import LogWriteBuffer
+
+
+class Cursor:
+    def __init__(self, db):
+        self.db = db
+        self.lastrowid = None
+
+    def execute(self, sql, args=()):
+        if self.db.fail_inserts:
+            raise RuntimeError("database is down")
+        if sql.startswith("INSERT INTO daily_logs"):
+            # Ids are handed out with gaps, as InnoDB may do for concurrent inserts
+            self.db.next_id += 7
+            self.lastrowid = self.db.next_id
+            self.db.logs[self.lastrowid] = args
+
+    def executemany(self, sql, rows):
+        pass
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return Cursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+class Database:
+    def __init__(self):
+        self.next_id = 100
+        self.logs = {}
+        self.indexed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_inserts = False
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = Database()
+    monkeypatch.setattr(write_buffer, "get_db_connection", lambda: Connection(db))
+    monkeypatch.setattr(write_buffer, "index_logs", lambda cursor, rows: db.indexed.extend(rows))
+    return db
+
+
+@pytest.fixture
+def buffer():
+    buffer = LogWriteBuffer(max_rows=50, max_delay=0.05)
+    yield buffer
+    buffer.stop()
+
+
+def test_concurrent_writes_share_a_commit_and_get_their_own_ids(db, buffer):
+    results = {}
+
+    def write(index):
+        results[index] = buffer.write("2026-10-18", f"encrypted-{index}", f"user-{index % 3}", f"entry {index}")
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results.values())) == 20
+    for index, log_id in results.items():
+        assert db.logs[log_id] == ("2026-10-18", f"encrypted-{index}", f"user-{index % 3}")
+    assert sorted(db.indexed) == sorted(
+        (log_id, f"user-{index % 3}", f"entry {index}") for index, log_id in results.items()
+    )
+    assert db.commits < 20
+    assert buffer.stats()["rows"] == 20
+
+
+def test_failed_batch_fails_its_writes_and_the_buffer_recovers(db, buffer):
+    db.fail_inserts = True
+    with pytest.raises(RuntimeError):
+        buffer.write("2026-10-18", "encrypted", "alice")
+    assert db.rollbacks == 1
+
+    db.fail_inserts = False
+    log_id = buffer.write("2026-10-18", "encrypted", "alice")
+    assert db.logs[log_id] == ("2026-10-18", "encrypted", "alice")
+    assert buffer.stats()["errors"] == 1
+
+
+def test_a_lost_connection_fails_the_batch_not_the_flusher(db, buffer, monkeypatch):
+    def no_connection():
+        raise RuntimeError("pool exhausted")
+
+    monkeypatch.setattr(write_buffer, "get_db_connection", no_connection)
+    with pytest.raises(RuntimeError):
+        buffer.write("2026-10-18", "encrypted", "alice", timeout=2)
+
+    monkeypatch.setattr(write_buffer, "get_db_connection", lambda: Connection(db))
+    assert buffer.write("2026-10-18", "encrypted", "alice", timeout=2) in db.logs
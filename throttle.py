@@ -0,0 +1,135 @@
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class MemoryBackend:
+    # Sliding-window log per key. Keys are kept in LRU order and capped so a
+    # spray of random usernames cannot grow the store without bound.
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._windows.get(key)
+            if hits is None:
+                hits = self._windows[key] = deque()
+            self._windows.move_to_end(key)
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return hits[0] + window - now
+            hits.append(now)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            return 0.0
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class RedisBackend:
+    _HIT_SCRIPT = """
+        local now = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local limit = tonumber(ARGV[3])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+        if redis.call('ZCARD', KEYS[1]) >= limit then
+            local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+            return tostring(tonumber(oldest[2]) + window - now)
+        end
+        redis.call('ZADD', KEYS[1], now, ARGV[4])
+        redis.call('EXPIRE', KEYS[1], math.ceil(window))
+        return '0'
+    """
+
+    def __init__(self, url, prefix="throttle:"):
+        import redis
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._hit = self._client.register_script(self._HIT_SCRIPT)
+
+    def hit(self, key, limit, window):
+        retry_after = self._hit(
+            keys=[self.prefix + key],
+            args=[time.time(), window, limit, uuid.uuid4().hex]
+        )
+        return float(retry_after)
+
+    def reset(self, key):
+        self._client.delete(self.prefix + key)
+
+
+class LoginThrottle:
+    def __init__(self, backend, user_limit, ip_limit, window):
+        self.backend = backend
+        self.user_limit = user_limit
+        self.ip_limit = ip_limit
+        self.window = window
+
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected_user = 0
+        self.rejected_ip = 0
+
+    def hit(self, username, ip):
+        # Returns 0 when the attempt may proceed, otherwise seconds until it may be retried.
+        retry_after = self.backend.hit(f"ip:{ip}", self.ip_limit, self.window)
+        if retry_after:
+            with self._lock:
+                self.rejected_ip += 1
+            return math.ceil(retry_after)
+
+        retry_after = self.backend.hit(f"user:{username.lower()}", self.user_limit, self.window)
+        if retry_after:
+            with self._lock:
+                self.rejected_user += 1
+            return math.ceil(retry_after)
+
+        with self._lock:
+            self.allowed += 1
+        return 0
+
+    def reset(self, username):
+        self.backend.reset(f"user:{username.lower()}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allowed": self.allowed,
+                "rejected_user": self.rejected_user,
+                "rejected_ip": self.rejected_ip,
+            }
+
+
+def _make_backend():
+    if os.getenv("THROTTLE_BACKEND", "memory") == "redis":
+        return RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryBackend(int(os.getenv("THROTTLE_MAX_KEYS", "100000")))
+
+
+login_throttle = LoginThrottle(
+    _make_backend(),
+    user_limit=int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_USER", "10")),
+    ip_limit=int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "100")),
+    window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "300")),
+)
+
+
+def client_ip(request):
+    if os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true":
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
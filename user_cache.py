@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from repository import repository
+
+load_dotenv()
+
+
+class UserCache:
+    # Short-lived copies of users rows (repository.ACCOUNT_COLUMNS, no password
+    # hash) so the account check on every request doesn't cost a query. Writes
+    # that change a user call invalidate() here; other app processes notice
+    # through version(), the shared repository.account_version stamp, which is
+    # read at most once every poll seconds and empties the cache when it moved.
+    def __init__(self, loader, ttl, max_entries, version=None, poll=1.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version
+        self.poll = poll
+
+        # username -> (record or None, expires_at), oldest first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidate(); a load that overlapped one is not stored
+        self._generation = 0
+        self._seen_version = None
+        self._next_poll = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def cached(self, username):
+        # (True, record) on a hit, (False, None) when a lookup is needed
+        with self._lock:
+            if self._poll_due():
+                return False, None
+            entry = self._entries.get(username)
+            if entry is None or entry[1] < time.monotonic():
+                return False, None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return True, entry[0]
+
+    def _poll_due(self):
+        return self.version is not None and time.monotonic() >= self._next_poll
+
+    def _sync(self):
+        with self._lock:
+            if not self._poll_due():
+                return
+            self._next_poll = time.monotonic() + self.poll
+        try:
+            version = self.version()
+        except Exception:
+            with self._lock:
+                self._next_poll = 0.0
+            raise
+        with self._lock:
+            if version != self._seen_version:
+                # Some account changed, maybe in another process: drop everything
+                self._generation += 1
+                self._entries.clear()
+                self._seen_version = version
+
+    def get(self, username):
+        self._sync()
+        hit, record = self.cached(username)
+        if hit:
+            return record
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        # Unknown usernames are cached too (as None), so repeated logins for
+        # them are as cheap as for real accounts.
+        record = self.loader(username)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[username] = (record, time.monotonic() + self.ttl)
+                self._entries.move_to_end(username)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, username):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(username, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = UserCache(
+    repository.get_account,
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+    version=repository.account_version,
+    poll=float(os.getenv("USER_CACHE_POLL", "1")),
+)
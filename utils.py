@@ -1,25 +1,52 @@
 import os
-import mysql.connector
+from datetime import date
 from fastapi import Request
 from passlib.context import CryptContext
+from db_pool import get_pool
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=int(os.getenv("DB_PORT")),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
-    )
-def get_user(username):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-    user = cursor.fetchone()
-    #logs = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return user
+    # Borrowed from the shared pool; conn.close() hands it back instead of disconnecting.
+    return get_pool().connection()
 def is_logged_in(request: Request):
-    return request.session.get("user") is not None
\ No newline at end of file
+    return request.session.get("user") is not None
+
+LOG_PAGE_SIZE = int(os.getenv("LOG_PAGE_SIZE", "50"))
+MAX_LOG_PAGE_SIZE = 200
+
+def clamp_page_size(page_size):
+    return max(1, min(page_size or LOG_PAGE_SIZE, MAX_LOG_PAGE_SIZE))
+def make_log_cursor(log_date, log_id):
+    return f"{log_date.isoformat()}_{log_id}"
+def parse_log_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        log_date, log_id = cursor.split("_", 1)
+        return date.fromisoformat(log_date), int(log_id)
+    except ValueError:
+        return None
+def log_page_query(username, cursor, page_size):
+    # Keyset pagination on (log_date, id): each page is an index range scan on
+    # idx_daily_logs_user_date_id no matter how deep into the history it is.
+    position = parse_log_cursor(cursor)
+    if position is None:
+        return (
+            "SELECT id, log_date, entry FROM daily_logs WHERE username = %s "
+            "ORDER BY log_date DESC, id DESC LIMIT %s",
+            (username, page_size + 1)
+        )
+    log_date, log_id = position
+    return (
+        "SELECT id, log_date, entry FROM daily_logs WHERE username = %s "
+        "AND (log_date < %s OR (log_date = %s AND id < %s)) "
+        "ORDER BY log_date DESC, id DESC LIMIT %s",
+        (username, log_date, log_date, log_id, page_size + 1)
+    )
+def split_log_page(rows, page_size):
+    # One extra row is fetched to learn whether another page exists.
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_id, last_date, _ = rows[-1]
+        return rows, make_log_cursor(last_date, last_id)
+    return rows, None
@@ -1,74 +1,438 @@
-import mysql.connector
+import argparse
+import json
 import openai
+import random
+import re
+import threading
+import time
+import tiktoken
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
+from encryption import fernet
+from repository import repository
+from batch_decrypt import decrypt_batch
+from decrypt_cache import decrypt_cache
+from llm_cache import summary_cache
+from metrics import record_model
 
 # Load environment variables
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
+# Point at any OpenAI-compatible endpoint, e.g. the local fake_model.py server
+if os.getenv("OPENAI_API_BASE"):
+    openai.api_base = os.getenv("OPENAI_API_BASE")
 
-def fetch_weekly_logs(username):
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = conn.cursor()
-    start_of_week = datetime.today() - timedelta(days=datetime.today().weekday())  # Monday
-    sql = "SELECT entry FROM daily_logs WHERE log_date >= %s AND username = %s"
-    cursor.execute(sql, (start_of_week.date(), username))
-    entries = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return "\n".join([entry[0] for entry in entries])
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+SYSTEM_PROMPT = "You are a productivity assistant."
+# Bump whenever the prompt wording below changes so cached summaries are not reused.
+PROMPT_VERSION = 1
+
+SUMMARY_PROMPT = (
+    "These are daily work logs. Please:\n"
+    "1. Generate bullet points for what was done.\n"
+    "2. Write a 1-paragraph summary of the overall work and progress.\n\n"
+)
+CHUNK_PROMPT = (
+    "These are daily work logs covering part of one week. "
+    "List concise bullet points of what was done, keeping dates where useful.\n\n"
+)
+REDUCE_PROMPT = (
+    "These are bullet-point notes, each covering part of one week of daily work logs. Please:\n"
+    "1. Generate bullet points for what was done across the whole week.\n"
+    "2. Write a 1-paragraph summary of the overall work and progress.\n\n"
+)
+# Appended to a summary whose notes had to be cut to fit the final call
+PARTIAL_NOTE = "\n\n(This summary covers only part of the week: the logs were too long to summarize in full.)"
+UPDATE_PROMPT = (
+    "Below is the current summary of a week of daily work logs, followed by log entries "
+    "added since it was written. Rewrite the summary so it also covers the new entries:\n"
+    "1. Generate bullet points for what was done.\n"
+    "2. Write a 1-paragraph summary of the overall work and progress.\n\n"
+)
+
+# Inputs up to SINGLE_CALL_TOKENS go to the model in one request; larger weeks are
+# split into CHUNK_TOKENS pieces, summarized in parallel and then combined.
+SINGLE_CALL_TOKENS = int(os.getenv("SUMMARY_SINGLE_CALL_TOKENS", "6000"))
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Map rounds before the notes are cut down to fit the final call
+SUMMARY_MAX_ROUNDS = int(os.getenv("SUMMARY_MAX_ROUNDS", "3"))
+_model_slots = threading.BoundedSemaphore(SUMMARY_CONCURRENCY)
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    # tiktoken fetches its BPE tables on first use; without network access (or a
+    # TIKTOKEN_CACHE_DIR) fall back to a ~4 characters per token estimate.
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(MODEL)
+            except KeyError:
+                # A model tiktoken doesn't know, e.g. a local one
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+def _split_oversized(text, budget):
+    encoding = _get_encoding()
+    if encoding is None:
+        return [text[i:i + budget * 4] for i in range(0, len(text), budget * 4)]
+    encoded = encoding.encode(text)
+    return [encoding.decode(encoded[i:i + budget]) for i in range(0, len(encoded), budget)]
+
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "5"))
+_RETRYABLE = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+)
+
+def _with_backoff(call):
+    # Rate limits and transient API errors are retried with jittered exponential
+    # backoff; Retry-After is honoured when the API sends one.
+    for attempt in range(MODEL_MAX_RETRIES + 1):
+        try:
+            return call()
+        except _RETRYABLE as exc:
+            if attempt == MODEL_MAX_RETRIES:
+                raise
+            headers = getattr(exc, "headers", None) or {}
+            try:
+                delay = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+            time.sleep(delay)
+
+def _complete(stage, instructions, text):
+    cache_key = summary_cache.key(MODEL, SYSTEM_PROMPT, f"{PROMPT_VERSION}/{stage}", text)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Caps in-flight model requests across every job and chunk in this process
+    with _model_slots:
+        started = time.perf_counter()
+        response = _with_backoff(lambda: openai.ChatCompletion.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": instructions + text}
+            ]
+        ))
+        record_model(stage, time.perf_counter() - started)
+
+    summary = response['choices'][0]['message']['content']
+    summary_cache.put(cache_key, summary)
+    return summary
+
+def split_logs(log_text, budget):
+    # Entries start with "YYYY-MM-DD: "; keep each day's entries together where
+    # the budget allows and only cut inside an entry that is too big on its own.
+    entries = [entry for entry in re.split(r"\n(?=\d{4}-\d{2}-\d{2}: )", log_text) if entry.strip()]
+    chunks, current, current_tokens = [], [], 0
+    for entry in entries:
+        tokens = count_tokens(entry)
+        if tokens > budget:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(entry, budget))
+            continue
+        if current and current_tokens + tokens > budget:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(entry)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _final_stage(log_text):
+    # Returns the (stage, instructions, text) of the call that produces the summary.
+    # The stage is "partial" when the notes had to be truncated; see with_partial_note.
+    if count_tokens(log_text) <= SINGLE_CALL_TOKENS:
+        return "summary", SUMMARY_PROMPT, log_text
+
+    # Map: summarize chunks concurrently, then reduce until the notes fit in one call
+    notes = log_text
+    tokens = count_tokens(notes)
+    for _ in range(SUMMARY_MAX_ROUNDS):
+        if tokens <= SINGLE_CALL_TOKENS:
+            break
+        chunks = split_logs(notes, CHUNK_TOKENS)
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_CONCURRENCY, len(chunks))) as pool:
+            partials = list(pool.map(lambda chunk: _complete("chunk", CHUNK_PROMPT, chunk), chunks))
+        notes = "\n\n".join(partials)
+        previous, tokens = tokens, count_tokens(notes)
+        if tokens >= previous:
+            break  # the model is not condensing; another round would only cost more
+    if tokens > SINGLE_CALL_TOKENS:
+        # Out of rounds or not shrinking: summarize what fits and mark the result partial
+        print(f"⚠️ Summary notes are still {tokens} tokens after reducing; "
+              f"keeping the first {SINGLE_CALL_TOKENS}.", flush=True)
+        return "partial", REDUCE_PROMPT, _split_oversized(notes, SINGLE_CALL_TOKENS)[0]
+    return "reduce", REDUCE_PROMPT, notes
+
+def with_partial_note(stage, summary):
+    return summary + PARTIAL_NOTE if stage == "partial" else summary
 
 def summarize_logs(log_text):
-    prompt = (
-        "These are daily work logs. Please:\n"
-        "1. Generate bullet points for what was done.\n"
-        "2. Write a 1-paragraph summary of the overall work and progress.\n\n"
-        f"{log_text}"
-    )
+    request = _final_stage(log_text)
+    return with_partial_note(request[0], _complete(*request))
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a productivity assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+def stream_complete(stage, instructions, text):
+    # Yields the completion in pieces as the model produces them; the pieces join
+    # to the same text _complete would return, and it is cached the same way.
+    cache_key = summary_cache.key(MODEL, SYSTEM_PROMPT, f"{PROMPT_VERSION}/{stage}", text)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    with _model_slots:
+        started = time.perf_counter()
+        response = _with_backoff(lambda: openai.ChatCompletion.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": instructions + text}
+            ],
+            stream=True
+        ))
+        for chunk in response:
+            piece = chunk['choices'][0].get('delta', {}).get('content')
+            if piece:
+                parts.append(piece)
+                yield piece
+        record_model(stage, time.perf_counter() - started)
+
+    summary_cache.put(cache_key, "".join(parts))
+
+def stream_summarize_logs(log_text):
+    request = _final_stage(log_text)
+    yield from stream_complete(*request)
+    if request[0] == "partial":
+        yield PARTIAL_NOTE
+
+def upsert_summary_args(username, start_date, end_date, summary_text, log_ids=None):
+    # log_ids are the daily_logs rows the summary covers; None for summaries
+    # that were not generated from the logs (e.g. written by hand).
+    encrypted_summary = fernet.encrypt(summary_text.encode()).decode()
+    covered = json.dumps(sorted(log_ids)) if log_ids is not None else None
+    return (start_date, end_date, encrypted_summary, username, covered)
 
-    return response['choices'][0]['message']['content']
+def save_summary_to_db(summary, start_date, end_date, username, log_ids=None):
+    store_weekly_summary(username, start_date, end_date, summary, log_ids)
 
-def save_summary_to_db(summary, start_date, end_date, username):
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
+def current_week():
+    start_of_week = datetime.today() - timedelta(days=datetime.today().weekday())
+    end_of_week = start_of_week + timedelta(days=6)
+    return start_of_week.date(), end_of_week.date()
+
+def load_week_entries(username, start_date, end_date):
+    # Returns [(log id, "date: entry")] for the week's readable logs
+    logs = repository.week_logs(username, start_date, end_date)
+
+    # Decrypt logs and prepare text for summarization, leaving out unreadable rows
+    decrypted = decrypt_batch(
+        fernet, [log[1] for log in logs],
+        row_ids=[log[2] for log in logs], table="daily_logs", owner=username
     )
-    cursor = conn.cursor()
-    sql = "INSERT INTO weekly_summaries (week_start, week_end, summary, username) VALUES (%s, %s, %s, %s)"
-    cursor.execute(sql, (start_date, end_date, summary, username))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    failed = {index for index, _ in decrypted.errors}
+    return [
+        (log[2], f"{log[0]}: {entry}")
+        for index, (log, entry) in enumerate(zip(logs, decrypted))
+        if index not in failed
+    ]
+
+def load_stored_summary(username, start_date):
+    # Returns (summary id, plaintext summary, covered log ids or None), or None
+    row = repository.get_summary(username, start_date)
+    if row is None:
+        return None
+    try:
+        summary = fernet.decrypt(row[1].encode()).decode()
+    except Exception:
+        return None
+    return row[0], summary, set(json.loads(row[2])) if row[2] else None
+
+def plan_weekly_summary(username, start_date, end_date):
+    # Works out how much of the week actually needs the model. Returns
+    # (log ids, stored summary, request): request is None when the stored summary
+    # already covers every log, otherwise the (stage, instructions, text) to send.
+    entries = load_week_entries(username, start_date, end_date)
+    log_ids = [log_id for log_id, _ in entries]
+    stored = load_stored_summary(username, start_date) if entries else None
+    covered = stored[2] if stored else None
+
+    if covered is not None and covered <= set(log_ids):
+        new_lines = [line for log_id, line in entries if log_id not in covered]
+        if not new_lines:
+            return log_ids, stored, None
+        # Only the new entries plus the previous summary, as long as that fits in
+        # one call; otherwise fall through and summarize the week from scratch.
+        text = f"Current summary:\n{stored[1]}\n\nNew entries:\n" + "\n".join(new_lines)
+        if count_tokens(text) <= SINGLE_CALL_TOKENS:
+            return log_ids, stored, ("update", UPDATE_PROMPT, text)
+
+    return log_ids, stored, _final_stage("\n".join(line for _, line in entries))
+
+def store_weekly_summary(username, start_date, end_date, summary_text, log_ids=None):
+    # Replaces the user's earlier summary for that week, if any
+    summary_id = repository.upsert_summary(upsert_summary_args(username, start_date, end_date, summary_text, log_ids))
+    decrypt_cache.invalidate_owner(username)
+    return summary_id
+
+def generate_weekly_summary(username):
+    start_date, end_date = current_week()
+    log_ids, stored, request = plan_weekly_summary(username, start_date, end_date)
+    if not log_ids:
+        return {"summary_id": None, "log_count": 0}
+    if request is None:
+        return {"summary_id": stored[0], "log_count": len(log_ids), "mode": "unchanged"}
+
+    summary = with_partial_note(request[0], _complete(*request))
+    summary_id = store_weekly_summary(username, start_date, end_date, summary, log_ids)
+    return {"summary_id": summary_id, "log_count": len(log_ids),
+            "mode": {"update": "incremental", "partial": "partial"}.get(request[0], "full")}
+
+def _chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def fetch_week_logs_bulk(usernames, start_date, end_date):
+    # One query per slice of users instead of one per user
+    placeholders = ", ".join(["%s"] * len(usernames))
+    rows = repository.query(f"""
+        SELECT id, username, log_date, entry FROM daily_logs
+        WHERE log_date BETWEEN %s AND %s AND username IN ({placeholders})
+        ORDER BY username, log_date, id
+    """, (start_date, end_date, *usernames))
+
+    decrypted = decrypt_batch(fernet, [row[3] for row in rows])
+    failed = {index for index, _ in decrypted.errors}
+    entries = {}
+    for index, (row, entry) in enumerate(zip(rows, decrypted)):
+        if index not in failed:
+            entries.setdefault(row[1], []).append((row[0], f"{row[2]}: {entry}"))
+    # {username: (log ids, "date: entry" text)}
+    return {
+        username: ([log_id for log_id, _ in lines], "\n".join(line for _, line in lines))
+        for username, lines in entries.items()
+    }
+
+def save_summaries_bulk(rows):
+    # rows: [(week_start, week_end, plaintext summary, username, log ids)]
+    repository.upsert_summaries([
+        upsert_summary_args(username, start, end, summary, log_ids)
+        for start, end, summary, username, log_ids in rows
+    ])
+
+def run_batch(week_of, concurrency, fetch_size, write_size):
+    start_date = week_of - timedelta(days=week_of.weekday())
+    end_date = start_date + timedelta(days=6)
+    started = time.perf_counter()
+
+    usernames = [row[0] for row in repository.query("SELECT username FROM users WHERE is_active = TRUE ORDER BY username")]
+    # A user is done when their stored summary covers every log id of the week,
+    # which is what makes a crashed run safe to simply start again; logs added
+    # after an earlier run (or a summary without log_ids) get summarized again.
+    week_ids = {}
+    for username, log_id in repository.query(
+        "SELECT username, id FROM daily_logs WHERE log_date BETWEEN %s AND %s AND username IS NOT NULL",
+        (start_date, end_date)
+    ):
+        week_ids.setdefault(username, set()).add(log_id)
+    covered = {
+        username: set(json.loads(log_ids)) if log_ids else set()
+        for username, log_ids in repository.query(
+            "SELECT username, log_ids FROM weekly_summaries WHERE week_start = %s", (start_date,)
+        )
+    }
+
+    with_logs = [username for username in usernames if username in week_ids]
+    todo = [username for username in with_logs if not week_ids[username] <= covered.get(username, set())]
+    print(f"📅 Week {start_date} – {end_date}: {len(usernames)} active users, "
+          f"{len(with_logs) - len(todo)} already summarized, {len(todo)} to go.")
+
+    stats = {"summarized": 0, "no_logs": len(usernames) - len(with_logs), "failed": 0}
+    pending_writes = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for batch in _chunked(todo, fetch_size):
+            texts = fetch_week_logs_bulk(batch, start_date, end_date)
+            stats["no_logs"] += len(batch) - len(texts)
+            futures = {pool.submit(summarize_logs, text): username for username, (_, text) in texts.items()}
+            for future in as_completed(futures):
+                username = futures[future]
+                try:
+                    pending_writes.append((start_date, end_date, future.result(), username, texts[username][0]))
+                    stats["summarized"] += 1
+                except Exception as exc:
+                    stats["failed"] += 1
+                    print(f"❌ {username}: {exc}")
+                if len(pending_writes) >= write_size:
+                    save_summaries_bulk(pending_writes)
+                    pending_writes = []
+            elapsed = time.perf_counter() - started
+            print(f"… {stats['summarized']} summarized, {stats['failed']} failed "
+                  f"({stats['summarized'] / elapsed:.2f} users/s)")
+    if pending_writes:
+        save_summaries_bulk(pending_writes)
+
+    elapsed = time.perf_counter() - started
+    cache = summary_cache.stats()
+    print(f"✅ Done in {elapsed:.1f}s: {stats['summarized']} summarized, {stats['no_logs']} without logs, "
+          f"{stats['failed']} failed, {stats['summarized'] / elapsed if elapsed else 0:.2f} users/s, "
+          f"summary cache hit rate {cache['hit_rate']:.0%}.")
+    return stats
 
 if __name__ == "__main__":
-    username = input("Enter username to summarize logs for: ").strip()
-    logs = fetch_weekly_logs(username)
-    
-    if not logs.strip():
-        print("⚠️ No logs found for this week.")
+    parser = argparse.ArgumentParser(description="Generate weekly summaries.")
+    parser.add_argument("--all", action="store_true", help="summarize every active user instead of prompting for one")
+    parser.add_argument("--week", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(),
+                        default=datetime.today().date(), help="any date in the week to summarize (default: this week)")
+    parser.add_argument("--concurrency", type=int, default=SUMMARY_CONCURRENCY, help="parallel model requests")
+    parser.add_argument("--fetch-size", type=int, default=200, help="users per bulk log query")
+    parser.add_argument("--write-size", type=int, default=50, help="summaries per batched insert")
+    parser.add_argument("--model-base-url", help="OpenAI-compatible endpoint, e.g. http://127.0.0.1:8765/v1")
+    args = parser.parse_args()
+
+    if args.model_base_url:
+        openai.api_base = args.model_base_url
+    if args.all:
+        if args.concurrency > SUMMARY_CONCURRENCY:
+            _model_slots = threading.BoundedSemaphore(args.concurrency)
+        run_batch(args.week, args.concurrency, args.fetch_size, args.write_size)
     else:
-        summary = summarize_logs(logs)
-        print("\n📋 Weekly Summary:\n")
-        print(summary)
-        
-        # Save to DB
-        start_of_week = datetime.today() - timedelta(days=datetime.today().weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        save_summary_to_db(summary, start_of_week.date(), end_of_week.date(), username)
-        print("💾 Summary saved to database.")
\ No newline at end of file
+        username = input("Enter username to summarize logs for: ").strip()
+        start_date, end_date = current_week()
+        log_ids, stored, request = plan_weekly_summary(username, start_date, end_date)
+
+        if not log_ids:
+            print("⚠️ No logs found for this week.")
+        elif request is None:
+            print("\n📋 Weekly Summary (no new logs since it was written):\n")
+            print(stored[1])
+        else:
+            summary = with_partial_note(request[0], _complete(*request))
+            print("\n📋 Weekly Summary:\n")
+            print(summary)
+
+            # Save to DB, replacing this week's earlier summary if there is one
+            save_summary_to_db(summary, start_date, end_date, username, log_ids)
+            print("💾 Summary saved to database.")
@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+from utils import get_db_connection
+from log_stats import record_log_query
+from search_index import index_logs
+from repository import content_version_query
+
+load_dotenv()
+
+# Group commit for daily_logs. Concurrent submissions are coalesced into one
+# transaction and one COMMIT, so a burst of /log requests pays for a single
+# fsync instead of one each. A submission's future only resolves once the batch
+# holding it has committed.
+
+
+class LogWriteBuffer:
+    def __init__(self, max_rows=100, max_delay=0.005):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._pending = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.max_batch = 0
+        self._commit_times = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    def submit(self, log_date, encrypted_entry, username, entry=None):
+        # Returns a Future resolving to the new daily_logs id. The plaintext
+        # entry, when given, is only used to update the search index.
+        future = Future()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((log_date, encrypted_entry, username, entry, future))
+            self._cond.notify()
+        return future
+
+    def write(self, log_date, encrypted_entry, username, entry=None, timeout=None):
+        # Raises concurrent.futures.TimeoutError rather than hanging the request
+        # if the batch never commits.
+        future = self.submit(log_date, encrypted_entry, username, entry)
+        return future.result(LOG_WRITE_TIMEOUT if timeout is None else timeout)
+
+    def _start(self):
+        self._stop = False
+        self._thread = threading.Thread(target=self._flusher, name="log-write-buffer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                if self._pending:
+                    waited = time.monotonic() - self._oldest
+                    if len(self._pending) >= self.max_rows or waited >= self.max_delay or self._stop:
+                        break
+                    self._cond.wait(self.max_delay - waited)
+                elif self._stop:
+                    return []
+                else:
+                    self._cond.wait()
+            batch = self._pending[:self.max_rows]
+            self._pending = self._pending[self.max_rows:]
+            self._oldest = time.monotonic() if self._pending else None
+            return batch
+
+    def _flusher(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            # A failed batch fails its own futures; the thread keeps serving later ones.
+            try:
+                self._commit(batch)
+            except Exception as exc:
+                self._fail(batch, exc)
+
+    def _fail(self, batch, exc):
+        with self._cond:
+            self.errors += 1
+        for *_, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        conn = cursor = None
+        try:
+            # Inside the try: a pool timeout or connect error must fail the batch, not the thread
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            # One INSERT per row so each log gets its real id; a multi-row
+            # INSERT's ids need not be consecutive (innodb_autoinc_lock_mode=2).
+            # The batch still shares a single commit, which is the expensive part.
+            ids = []
+            for log_date, encrypted, username, *_ in batch:
+                cursor.execute(
+                    "INSERT INTO daily_logs (log_date, entry, username) VALUES (%s, %s, %s)",
+                    (log_date, encrypted, username)
+                )
+                ids.append(cursor.lastrowid)
+            index_logs(cursor, [
+                (log_id, username, entry)
+                for log_id, (_, _, username, entry, _) in zip(ids, batch) if entry is not None
+            ])
+            stats = [record_log_query(username, log_date) for log_date, _, username, *_ in batch]
+            cursor.executemany(stats[0][0], [query_args for _, query_args in stats])
+            versions = [content_version_query(username) for username in sorted({row[2] for row in batch})]
+            cursor.executemany(versions[0][0], [query_args for _, query_args in versions])
+            conn.commit()
+        except Exception as exc:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            self._fail(batch, exc)
+            return
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if conn is not None:
+                conn.close()
+
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self.batches += 1
+            self.rows += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            self._commit_times.append(elapsed)
+            self._batch_sizes.append(len(batch))
+        for log_id, (*_, future) in zip(ids, batch):
+            if not future.done():
+                future.set_result(log_id)
+
+    def stop(self, timeout=5.0):
+        # Flushes whatever is still pending before the thread exits.
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stop = True
+            self._cond.notify_all()
+            thread = self._thread
+        thread.join(timeout)
+        with self._cond:
+            self._thread = None
+
+    def stats(self):
+        with self._cond:
+            times = sorted(self._commit_times)
+            sizes = list(self._batch_sizes)
+            return {
+                "enabled": LOG_WRITE_BUFFER,
+                "max_rows": self.max_rows,
+                "max_delay_ms": self.max_delay * 1000,
+                "pending": len(self._pending),
+                "batches": self.batches,
+                "rows": self.rows,
+                "errors": self.errors,
+                "avg_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+                "max_batch_size": self.max_batch,
+                "commit_ms_p50": times[len(times) // 2] * 1000 if times else 0.0,
+                "commit_ms_p95": times[int(len(times) * 0.95)] * 1000 if times else 0.0,
+                "commit_ms_max": times[-1] * 1000 if times else 0.0,
+            }
+
+
+LOG_WRITE_BUFFER = os.getenv("LOG_WRITE_BUFFER", "false").lower() == "true"
+# Longest a request waits for its batch to commit
+LOG_WRITE_TIMEOUT = float(os.getenv("LOG_WRITE_TIMEOUT", "30"))
+
+log_write_buffer = LogWriteBuffer(
+    max_rows=int(os.getenv("LOG_WRITE_BATCH_ROWS", "100")),
+    max_delay=float(os.getenv("LOG_WRITE_BATCH_MS", "5")) / 1000,
+)